@@ -0,0 +1,149 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+from .models import Employee, Menu, Vote
+from .serializers import MAX_BALLOT_MENUS
+from .tally import add_delta, apply_deltas
+
+
+class DailyLimitExceeded(Exception):
+    """A vote would give an employee more than MAX_BALLOT_MENUS menus on a day."""
+
+
+def lock_employees(employee_ids):
+    """Lock employee rows in ID order, so each employee's votes are serialized."""
+    list(
+        Employee.objects.select_for_update()
+        .filter(pk__in=employee_ids)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+def read_menus(menu_ids):
+    """
+    Return `{menu_id: (date, restaurant_id)}` of the menus that still exist.
+
+    The rows are read FOR KEY SHARE, the lock a vote's foreign key check takes
+    anyway: votes for a menu do not block each other, but moving or deleting
+    the menu (FOR UPDATE in `MenuViewSet._lock`) waits for them to commit, and
+    they wait for it, so the tally is never updated with a stale date.
+    """
+    table = connection.ops.quote_name(Menu._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT id, date, restaurant_id FROM {table} "
+            "WHERE id = ANY(%s) ORDER BY id FOR KEY SHARE",
+            [sorted(menu_ids)],
+        )
+        return {
+            menu_id: (day, restaurant_id)
+            for menu_id, day, restaurant_id in cursor.fetchall()
+        }
+
+
+def check_daily_limit(votes, exclude_vote_id=None):
+    """
+    Raise DailyLimitExceeded if writing `votes` would leave an employee with
+    votes for more than MAX_BALLOT_MENUS menus on one day.
+
+    `votes` are `(employee_id, date, menu_id)` triples; their employees must be
+    locked. A vote that replaces the employee's vote for the same menu does not
+    count twice.
+    """
+    menus = defaultdict(set)
+    for employee_id, day, menu_id in votes:
+        menus[(employee_id, day)].add(menu_id)
+    existing = Vote.objects.filter(
+        employee_id__in={employee_id for employee_id, _ in menus},
+        menu__date__in={day for _, day in menus},
+    )
+    if exclude_vote_id is not None:
+        existing = existing.exclude(pk=exclude_vote_id)
+    for employee_id, day, menu_id in existing.values_list(
+        "employee_id", "menu__date", "menu_id"
+    ):
+        if (employee_id, day) in menus:
+            menus[(employee_id, day)].add(menu_id)
+    days = sorted(
+        {day for (_, day), ids in menus.items() if len(ids) > MAX_BALLOT_MENUS}
+    )
+    if days:
+        raise DailyLimitExceeded(
+            f"At most {MAX_BALLOT_MENUS} menus can be voted for per day; "
+            f"exceeded on {', '.join(day.isoformat() for day in days)}."
+        )
+
+
+def submit_ballot(employee_id, entries):
+    """
+    Write one validated ballot; see `submit_ballots`.
+
+    Returns the upserted votes in the order of `entries`.
+    """
+    votes = {vote.menu_id: vote for vote in submit_ballots([(employee_id, entries)])}
+    return [votes[entry["menu_id"]] for entry in entries]
+
+
+def submit_ballots(ballots):
+    """
+    Write many employees' ballots in one transaction with one upsert.
+
+    `ballots` is a sequence of `(employee_id, entries)` applied in order, so a
+    later ballot for the same employee and menu replaces the earlier points.
+    Re-voting for a menu replaces the previous points instead of failing on
+    the (employee, menu) unique constraint, and the daily tally is updated in
+    the same transaction. Menu dates and restaurants are read at write time, under `read_menus`.
+    Raises `Menu.DoesNotExist` if a menu has been deleted since the ballot was
+    accepted, and DailyLimitExceeded if an employee would exceed the daily
+    number of menus. Returns the upserted votes.
+    """
+    points = {}
+    for employee_id, entries in ballots:
+        for entry in entries:
+            points[(employee_id, entry["menu_id"])] = entry["points"]
+    employee_ids = sorted({employee_id for employee_id, _ in points})
+    menu_ids = {menu_id for _, menu_id in points}
+
+    with transaction.atomic():
+        lock_employees(employee_ids)
+        menus = read_menus(menu_ids)
+        missing = menu_ids - menus.keys()
+        if missing:
+            raise Menu.DoesNotExist(f"Menus {sorted(missing)} no longer exist.")
+        check_daily_limit(
+            [
+                (employee_id, menus[menu_id][0], menu_id)
+                for employee_id, menu_id in points
+            ]
+        )
+        previous = {
+            (employee_id, menu_id): old_points
+            for employee_id, menu_id, old_points in Vote.objects.filter(
+                employee_id__in=employee_ids, menu_id__in=menu_ids
+            ).values_list("employee_id", "menu_id", "points")
+        }
+        votes = Vote.objects.bulk_create(
+            [
+                Vote(employee_id=employee_id, menu_id=menu_id, points=new_points)
+                for (employee_id, menu_id), new_points in sorted(points.items())
+            ],
+            update_conflicts=True,
+            unique_fields=["employee", "menu"],
+            update_fields=["points"],
+            batch_size=1000,
+        )
+        deltas = {}
+        for key, new_points in points.items():
+            old_points = previous.get(key)
+            day, restaurant_id = menus[key[1]]
+            add_delta(
+                deltas,
+                day,
+                restaurant_id,
+                new_points - (old_points or 0),
+                0 if old_points is not None else 1,
+            )
+        apply_deltas(deltas)
+    return votes
@@ -0,0 +1,104 @@
+"""
+Pytest plugin that holds API requests to per-endpoint budgets.
+
+Requests made through the `budget_client` fixture record their SQL query count
+and wall time. When the test finishes, every request is checked against
+`core/budgets.json`, keyed by method and URL name:
+
+    {"GET menu-today": {"queries": 1, "ms": 150}}
+
+Query budgets are exact ceilings. Time budgets are generous and can be scaled
+on slow machines with the LS_BUDGET_TIME_FACTOR environment variable.
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+BUDGETS_FILE = Path(__file__).with_name("budgets.json")
+TIME_FACTOR_ENV = "LS_BUDGET_TIME_FACTOR"
+
+
+@dataclass
+class Measurement:
+    endpoint: str
+    path: str
+    queries: int
+    ms: float
+    sql: list = field(default_factory=list)
+
+
+def load_budgets(path=BUDGETS_FILE):
+    with open(path) as budgets_file:
+        return json.load(budgets_file)
+
+
+def check_budgets(measurements, budgets, time_factor=1.0):
+    """Return a description of every measurement that is over its budget."""
+    failures = []
+    for measurement in measurements:
+        budget = budgets.get(measurement.endpoint)
+        if budget is None:
+            failures.append(
+                f"{measurement.endpoint} ({measurement.path}): "
+                f"no budget in {BUDGETS_FILE.name}"
+            )
+            continue
+        if measurement.queries > budget["queries"]:
+            sql = "".join(f"\n    {statement}" for statement in measurement.sql)
+            failures.append(
+                f"{measurement.endpoint} ({measurement.path}): "
+                f"{measurement.queries} queries, budget {budget['queries']}{sql}"
+            )
+        if measurement.ms > budget["ms"] * time_factor:
+            failures.append(
+                f"{measurement.endpoint} ({measurement.path}): "
+                f"{measurement.ms:.1f} ms, budget {budget['ms'] * time_factor:g} ms"
+            )
+    return failures
+
+
+class BudgetClient(APIClient):
+    """APIClient that measures every request it makes."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.measurements = []
+
+    def request(self, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = super().request(**kwargs)
+            elapsed = (time.perf_counter() - started) * 1000
+        match = response.resolver_match
+        name = match.view_name if match else kwargs["PATH_INFO"]
+        self.measurements.append(
+            Measurement(
+                endpoint=f"{kwargs['REQUEST_METHOD']} {name}",
+                path=kwargs["PATH_INFO"],
+                queries=len(context.captured_queries),
+                ms=elapsed,
+                sql=[query["sql"] for query in context.captured_queries],
+            )
+        )
+        return response
+
+
+@pytest.fixture
+def budget_client():
+    client = BudgetClient()
+    yield client
+    failures = check_budgets(
+        client.measurements,
+        load_budgets(),
+        float(os.environ.get(TIME_FACTOR_ENV, 1)),
+    )
+    if failures:
+        pytest.fail("Request budgets exceeded:\n" + "\n".join(failures))
@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from .config import settings
+
+# Menu board timeout that `serve` uses with a per-worker local-memory cache.
+LOCAL_BOARD_TIMEOUT = 5
+
+# Per-process hit/miss counters for the menu board cache.
+menu_board_stats = {"hits": 0, "misses": 0}
+
+
+def _menu_board_key(day):
+    return f"menus:board:{day.isoformat()}"
+
+
+def get_menu_board(day, build):
+    """Return the cached menu board for `day`, building it with `build()` on a miss."""
+    key = _menu_board_key(day)
+    board = cache.get(key)
+    if board is not None:
+        menu_board_stats["hits"] += 1
+        return board
+    menu_board_stats["misses"] += 1
+    board = build()
+    timeout = settings.cache.board_timeout
+    cache.set(key, board, DEFAULT_TIMEOUT if timeout is None else timeout)
+    return board
+
+
+def invalidate_menu_board(*days):
+    """
+    Drop the cached menu boards for the given dates.
+
+    With a local-memory cache this only reaches the current worker; the
+    others serve their copy until it times out.
+    """
+    cache.delete_many([_menu_board_key(day) for day in set(days)])
+
+
+def menu_board_hit_rate():
+    hits, misses = menu_board_stats["hits"], menu_board_stats["misses"]
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else None,
+    }
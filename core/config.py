@@ -1,8 +1,65 @@
-from pydantic import Extra, Field, SecretStr
-from pydantic_settings import BaseSettings, SettingsConfigDict
+import functools
+from pathlib import Path
+from typing import Literal
 
+from pydantic import Field, SecretStr
+from pydantic_settings import BaseSettings, DotEnvSettingsSource, SettingsConfigDict
 
-class Postgres(BaseSettings):
+ENV_FILE = ".env"
+# Read replicas are the `DATABASES` aliases `replica1`, `replica2`, ...
+REPLICA_ALIAS_PREFIX = "replica"
+
+
+@functools.lru_cache
+def _read_env_file(path, encoding, case_sensitive, ignore_empty, parse_none_str):
+    return DotEnvSettingsSource._static_read_env_file(
+        path,
+        encoding=encoding,
+        case_sensitive=case_sensitive,
+        ignore_empty=ignore_empty,
+        parse_none_str=parse_none_str,
+    )
+
+
+class _SharedDotEnvSource(DotEnvSettingsSource):
+    """Parses each `.env` file once per process, for all sections."""
+
+    def _read_env_file(self, file_path: Path):
+        return _read_env_file(
+            file_path.resolve(),
+            self.env_file_encoding,
+            self.case_sensitive,
+            self.env_ignore_empty,
+            self.env_parse_none_str,
+        )
+
+
+class Section(BaseSettings):
+    """Base of the settings sections; they share one parse of `.env`."""
+
+    # `.env` is read by _SharedDotEnvSource rather than by every section.
+    model_config = SettingsConfigDict(
+        env_file=None, env_file_encoding="utf-8", extra="ignore"
+    )
+
+    @classmethod
+    def settings_customise_sources(
+        cls,
+        settings_cls,
+        init_settings,
+        env_settings,
+        dotenv_settings,
+        file_secret_settings,
+    ):
+        return (
+            init_settings,
+            env_settings,
+            _SharedDotEnvSource(settings_cls, env_file=ENV_FILE),
+            file_secret_settings,
+        )
+
+
+class Postgres(Section):
     driver: str = "postgresql+asyncpg"
     host: str = Field("localhost", alias="LS_POSTGRES_HOST")
     port: int = 5432
@@ -10,35 +67,173 @@ class Postgres(BaseSettings):
     password: SecretStr = Field(..., alias="LS_POSTGRES_PASSWORD")
     database: str = Field("lunch_service_db", alias="LS_POSTGRES_DATABASE")
 
-    model_config = SettingsConfigDict(
-        env_file=".env",
-        env_prefix="LS_POSTGRES_",
-        env_file_encoding="utf-8",
-        extra=Extra.ignore,
-    )
+    # How Django holds connections:
+    # - "persistent": one connection per worker thread, reused for conn_max_age s
+    # - "pool": a psycopg connection pool per process (CONN_MAX_AGE must be 0)
+    # - "pgbouncer": behind a transaction-level pooler, so no server-side
+    #   cursors or prepared statements
+    conn_mode: Literal["persistent", "pool", "pgbouncer"] = "persistent"
+    conn_max_age: int = 60
+    health_checks: bool = True
+    pool_min_size: int = 2
+    pool_max_size: int = 10
+    pool_timeout: float = 10.0
+    pool_max_idle: float = 600.0
+    pool_max_lifetime: float = 3600.0
+    # Comma-separated hosts of read replicas, with the primary's port,
+    # database and credentials. Safe API requests read from them.
+    replica_hosts: str = ""
+    # Seconds a user keeps reading from the primary after writing.
+    replica_pin_seconds: int = 5
+
+    def django_database(self, host=None):
+        """Build a Django `DATABASES` entry for this server."""
+        database = {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": self.database,
+            "USER": self.username,
+            "PASSWORD": self.password.get_secret_value(),
+            "HOST": host or self.host,
+            "PORT": self.port,
+            "CONN_MAX_AGE": self.conn_max_age,
+            "CONN_HEALTH_CHECKS": self.health_checks,
+            "OPTIONS": {},
+        }
+        if self.conn_mode == "pool":
+            database["CONN_MAX_AGE"] = 0
+            database["OPTIONS"]["pool"] = {
+                "min_size": self.pool_min_size,
+                "max_size": self.pool_max_size,
+                "timeout": self.pool_timeout,
+                "max_idle": self.pool_max_idle,
+                "max_lifetime": self.pool_max_lifetime,
+            }
+        elif self.conn_mode == "pgbouncer":
+            database["DISABLE_SERVER_SIDE_CURSORS"] = True
+        return database
 
+    def replica_databases(self):
+        """Build the Django `DATABASES` entries of the read replicas."""
+        hosts = [host.strip() for host in self.replica_hosts.split(",") if host.strip()]
+        databases = {}
+        for number, host in enumerate(hosts, start=1):
+            database = self.django_database(host)
+            # Tests have no replica, so replicas read the primary's test database.
+            database["TEST"] = {"MIRROR": "default"}
+            databases[f"{REPLICA_ALIAS_PREFIX}{number}"] = database
+        return databases
 
-class SuperUser(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="LS_POSTGRES_")
+
+
+class SuperUser(Section):
     username: str = Field(..., alias="SUPERUSER_USERNAME")
     email: str = Field(..., alias="SUPERUSER_EMAIL")
     password: SecretStr = Field(..., alias="SUPERUSER_PASSWORD")
 
-    model_config = SettingsConfigDict(
-        env_file=".env",
-        env_prefix="SUPERUSER_",
-        env_file_encoding="utf-8",
-        extra=Extra.ignore,
+    model_config = SettingsConfigDict(env_prefix="SUPERUSER_")
+
+
+class Cache(Section):
+    backend: str = Field(
+        "django.core.cache.backends.locmem.LocMemCache", alias="LS_CACHE_BACKEND"
     )
+    location: str = Field("lunch-service", alias="LS_CACHE_LOCATION")
+    timeout: int = Field(300, alias="LS_CACHE_TIMEOUT")
+    # Seconds the menu board is cached; None uses `timeout`. `serve` lowers it
+    # for several workers with a local-memory cache, where a menu change only
+    # invalidates the board of the worker that made it.
+    board_timeout: int | None = Field(None, alias="LS_CACHE_BOARD_TIMEOUT")
 
+    model_config = SettingsConfigDict(env_prefix="LS_CACHE_")
 
-class Settings(BaseSettings):
-    db: Postgres = Postgres()  # type: ignore
-    superuser: SuperUser = SuperUser()  # type: ignore
 
-    model_config = SettingsConfigDict(
-        env_file=".env", env_file_encoding="utf-8", extra=Extra.ignore
-    )
+class Auth(Section):
+    token_ttl: int = Field(15 * 60, alias="LS_AUTH_TOKEN_TTL")
+    refresh_ttl: int = Field(7 * 24 * 60 * 60, alias="LS_AUTH_REFRESH_TTL")
+
+    model_config = SettingsConfigDict(env_prefix="LS_AUTH_")
+
+
+class Server(Section):
+    bind: str = Field("0.0.0.0:8000", alias="LS_SERVER_BIND")
+    # 0 means two workers per CPU core plus one.
+    workers: int = Field(0, alias="LS_SERVER_WORKERS")
+    asgi: bool = Field(True, alias="LS_SERVER_ASGI")
+    timeout: int = Field(30, alias="LS_SERVER_TIMEOUT")
+    graceful_timeout: int = Field(30, alias="LS_SERVER_GRACEFUL_TIMEOUT")
+    keepalive: int = Field(5, alias="LS_SERVER_KEEPALIVE")
+    max_requests: int = Field(10000, alias="LS_SERVER_MAX_REQUESTS")
+    max_requests_jitter: int = Field(1000, alias="LS_SERVER_MAX_REQUESTS_JITTER")
+    # Comma-separated; both are required by the production profile.
+    allowed_hosts: str = Field("", alias="LS_SERVER_ALLOWED_HOSTS")
+    secret_key: SecretStr | None = Field(None, alias="LS_SERVER_SECRET_KEY")
+
+    model_config = SettingsConfigDict(env_prefix="LS_SERVER_")
+
+
+class Ingest(Section):
+    # "sync" writes every ballot in its own transaction. "queue" appends new
+    # app ballots to a local SQLite queue and answers 202 Accepted; the
+    # `flush_votes` command drains the queue into PostgreSQL in batches.
+    mode: Literal["sync", "queue"] = Field("sync", alias="LS_INGEST_MODE")
+    queue_path: str = Field("vote_queue.sqlite3", alias="LS_INGEST_QUEUE_PATH")
+    batch_size: int = Field(2000, alias="LS_INGEST_BATCH_SIZE")
+    flush_interval: float = Field(0.5, alias="LS_INGEST_FLUSH_INTERVAL")
+    # How long committed ballots stay queryable by their status endpoint.
+    retention: int = Field(24 * 60 * 60, alias="LS_INGEST_RETENTION")
+
+    model_config = SettingsConfigDict(env_prefix="LS_INGEST_")
+
+
+class Metrics(Section):
+    enabled: bool = Field(True, alias="LS_METRICS_ENABLED")
+    # Directory where every worker saves its counters, so that /metrics can
+    # report all workers of the server. Empty reports the serving worker only;
+    # `serve` picks a temporary directory when it starts several workers.
+    dir: str = Field("", alias="LS_METRICS_DIR")
+    flush_interval: float = Field(1.0, alias="LS_METRICS_FLUSH_INTERVAL")
+    # When set, /metrics requires `Authorization: Bearer <token>`.
+    token: SecretStr | None = Field(None, alias="LS_METRICS_TOKEN")
+
+    model_config = SettingsConfigDict(env_prefix="LS_METRICS_")
+
+
+class Settings:
+    """
+    The service settings, one section per concern.
+
+    A section reads the environment and `.env` when it is first used, so a
+    process only loads, and only requires, the sections it needs.
+    """
+
+    @functools.cached_property
+    def db(self) -> Postgres:
+        return Postgres()  # type: ignore
+
+    @functools.cached_property
+    def superuser(self) -> SuperUser:
+        return SuperUser()  # type: ignore
+
+    @functools.cached_property
+    def cache(self) -> Cache:
+        return Cache()  # type: ignore
+
+    @functools.cached_property
+    def auth(self) -> Auth:
+        return Auth()  # type: ignore
+
+    @functools.cached_property
+    def server(self) -> Server:
+        return Server()  # type: ignore
+
+    @functools.cached_property
+    def ingest(self) -> Ingest:
+        return Ingest()  # type: ignore
+
+    @functools.cached_property
+    def metrics(self) -> Metrics:
+        return Metrics()  # type: ignore
 
 
-# Create an instance of Settings to load environment variables
 settings = Settings()
@@ -0,0 +1,39 @@
+from django.db import connections
+
+
+def pool_stats():
+    """
+    Report per-alias connection pool statistics for this process.
+
+    Aliases that do not use a pool only report their connection mode.
+    """
+    stats = {}
+    for alias in connections:
+        connection = connections[alias]
+        pool = getattr(connection, "pool", None)
+        if pool is None:
+            stats[alias] = {
+                "pooled": False,
+                "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+                "connected": connection.connection is not None,
+            }
+            continue
+        raw = pool.get_stats()
+        requests = raw.get("requests_num", 0)
+        stats[alias] = {
+            "pooled": True,
+            "min_size": raw.get("pool_min"),
+            "max_size": raw.get("pool_max"),
+            "size": raw.get("pool_size", 0),
+            "in_use": raw.get("pool_size", 0) - raw.get("pool_available", 0),
+            "available": raw.get("pool_available", 0),
+            "waiting": raw.get("requests_waiting", 0),
+            "checkouts": requests,
+            "checkout_timeouts": raw.get("requests_errors", 0),
+            "avg_checkout_ms": (
+                raw.get("requests_wait_ms", 0) / requests if requests else 0.0
+            ),
+            "connections_opened": raw.get("connections_num", 0),
+            "connection_errors": raw.get("connections_errors", 0),
+        }
+    return stats
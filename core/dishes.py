@@ -0,0 +1,101 @@
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Dish, ItemsDocument, Menu
+
+
+def _labels(value):
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, (list, tuple)):
+        return []
+    return [str(label).strip().lower()[:50] for label in value if str(label).strip()]
+
+
+def parse_items(items):
+    """
+    Turn free-form `Menu.items` into `(name, description, tags, allergens)`.
+
+    Understands a comma-separated string of dish names, a list of names or
+    dish objects, and a `{name: description}` or `{name: {...}}` mapping.
+    Dish objects may carry `name`, `description`, `tags` and `allergens`.
+    """
+    if isinstance(items, str):
+        entries = [(name, None) for name in items.split(",")]
+    elif isinstance(items, list):
+        entries = [
+            (item.get("name", ""), item) if isinstance(item, dict) else (item, None)
+            for item in items
+        ]
+    elif isinstance(items, dict):
+        entries = list(items.items())
+    else:
+        entries = []
+
+    dishes = []
+    for name, details in entries:
+        name = str(name).strip()[:255]
+        if not name:
+            continue
+        if isinstance(details, dict):
+            dishes.append(
+                (
+                    name,
+                    str(details.get("description", "")),
+                    _labels(details.get("tags", [])),
+                    _labels(details.get("allergens", [])),
+                )
+            )
+        else:
+            description = "" if details is None else str(details)
+            dishes.append((name, description, [], []))
+    return dishes
+
+
+def build_dishes(menu):
+    """Return unsaved `Dish` rows for a menu's items."""
+    return [
+        Dish(
+            menu=menu,
+            name=name,
+            description=description,
+            tags=tags,
+            allergens=allergens,
+            labels=" ".join(tags + allergens),
+        )
+        for name, description, tags, allergens in parse_items(menu.items)
+    ]
+
+
+def sync_dishes(menu):
+    """Replace a menu's dishes with the ones in its current items."""
+    Dish.objects.filter(menu=menu).delete()
+    Dish.objects.bulk_create(build_dishes(menu))
+
+
+def search_menus(queryset, text, allergen_free=()):
+    """
+    Filter menus to those with a dish or item matching `text`.
+
+    `text` is a web search query such as `vegan -nuts`, matched against dish
+    names, descriptions, tags and allergens through a GIN index on the dish
+    table. Menus whose items yield no dishes are still found through the GIN
+    index on the items. With `allergen_free`, only dishes known not to contain
+    those allergens match, so such menus are left out.
+    """
+    query = SearchQuery(text, config="simple", search_type="websearch")
+    dishes = Dish.objects.annotate(
+        document=SearchVector("name", "description", "labels", config="simple")
+    ).filter(document=query)
+    allergens = _labels(list(allergen_free))
+    if allergens:
+        dishes = dishes.exclude(allergens__overlap=allergens)
+        return queryset.filter(id__in=dishes.values("menu_id"))
+    items = (
+        Menu.objects.annotate(document=ItemsDocument())
+        .filter(document=query)
+        .exclude(Exists(Dish.objects.filter(menu=OuterRef("pk"))))
+    )
+    return queryset.filter(
+        Q(id__in=dishes.values("menu_id")) | Q(id__in=items.values("id"))
+    )
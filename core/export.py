@@ -0,0 +1,60 @@
+import csv
+import io
+
+import orjson
+from asgiref.sync import sync_to_async
+
+EXPORT_FIELDS = ("id", "employee", "menu", "points", "date", "restaurant")
+EXPORT_CHUNK_SIZE = 5000
+
+
+def _fetch(queryset, after_id, chunk_size):
+    return list(
+        queryset.filter(id__gt=after_id)
+        .order_by("id")
+        .values_list(
+            "id",
+            "employee_id",
+            "menu_id",
+            "points",
+            "menu__date",
+            "menu__restaurant_id",
+        )[:chunk_size]
+    )
+
+
+def encode_ndjson(rows):
+    return b"".join(orjson.dumps(dict(zip(EXPORT_FIELDS, row))) + b"\n" for row in rows)
+
+
+def encode_csv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def export_rows(queryset, encode, header=b"", chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the votes of `queryset` encoded in chunks of `chunk_size` rows.
+
+    Each chunk is a separate keyset query on the primary key, so memory stays
+    flat however many rows are exported and no transaction or server-side
+    cursor is held open while the client reads.
+    """
+    if header:
+        yield header
+    after_id = 0
+    while rows := _fetch(queryset, after_id, chunk_size):
+        yield encode(rows)
+        after_id = rows[-1][0]
+
+
+async def aexport_rows(queryset, encode, header=b"", chunk_size=EXPORT_CHUNK_SIZE):
+    """Asynchronous `export_rows`, so ASGI servers stream it chunk by chunk."""
+    if header:
+        yield header
+    fetch = sync_to_async(_fetch)
+    after_id = 0
+    while rows := await fetch(queryset, after_id, chunk_size):
+        yield encode(rows)
+        after_id = rows[-1][0]
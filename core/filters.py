@@ -0,0 +1,85 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .utils import parse_date_param
+
+
+def parse_id_param(params, name):
+    """Parse an optional integer ID query parameter."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "Must be an integer ID."})
+
+
+def parse_id_list_param(params, name):
+    """Parse an optional comma-separated list of integer IDs."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return [int(item) for item in value.split(",") if item]
+    except ValueError:
+        raise ValidationError({name: "Must be a comma-separated list of IDs."})
+
+
+def date_filters(params, field):
+    """Translate `date`, `date_from` and `date_to` into lookups on `field`."""
+    filters = {}
+    day = parse_date_param(params, "date")
+    if day is not None:
+        filters[field] = day
+    date_from = parse_date_param(params, "date_from")
+    if date_from is not None:
+        filters[f"{field}__gte"] = date_from
+    date_to = parse_date_param(params, "date_to")
+    if date_to is not None:
+        filters[f"{field}__lte"] = date_to
+    return filters
+
+
+def restaurant_filters(params, field):
+    """Translate `restaurant` and `restaurant__in` into lookups on `field`."""
+    filters = {}
+    restaurant = parse_id_param(params, "restaurant")
+    if restaurant is not None:
+        filters[field] = restaurant
+    restaurants = parse_id_list_param(params, "restaurant__in")
+    if restaurants is not None:
+        filters[f"{field}__in"] = restaurants
+    return filters
+
+
+class MenuFilterBackend(BaseFilterBackend):
+    """Filter menus by `date`, `date_from`/`date_to`, `restaurant` and `restaurant__in`."""
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        return queryset.filter(
+            **date_filters(params, "date"),
+            **restaurant_filters(params, "restaurant_id"),
+        )
+
+
+class VoteFilterBackend(BaseFilterBackend):
+    """
+    Filter votes by the date and restaurant of their menu, and by `menu` and
+    `employee`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        filters = {
+            **date_filters(params, "menu__date"),
+            **restaurant_filters(params, "menu__restaurant_id"),
+        }
+        menu = parse_id_param(params, "menu")
+        if menu is not None:
+            filters["menu_id"] = menu
+        employee = parse_id_param(params, "employee")
+        if employee is not None:
+            filters["employee_id"] = employee
+        return queryset.filter(**filters)
@@ -0,0 +1,140 @@
+import functools
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+# How long a completed response is replayed for the same key.
+IDEMPOTENCY_TTL = 24 * 60 * 60
+# How long a key stays claimed by a request that is still running.
+IN_FLIGHT_TIMEOUT = 30
+# How long a duplicate waits for the original request to finish, blocking its
+# worker thread, before it is told to retry.
+DUPLICATE_WAIT = 1.0
+POLL_INTERVAL = 0.05
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used with a different request."
+    default_code = "idempotency_key_reused"
+
+
+class IdempotencyKeyInFlight(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still in progress."
+    default_code = "idempotency_key_in_flight"
+    # Sent as Retry-After by DRF's exception handler.
+    wait = 1
+
+
+def _cache_key(request, key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f"idempotency:{request.user.pk}:{digest}"
+
+
+def _fingerprint(request):
+    digest = hashlib.sha256()
+    for part in (
+        request.method,
+        request.path,
+        request.headers.get("Build-Version", ""),
+    ):
+        digest.update(part.encode() + b"\0")
+    digest.update(json.dumps(request.data, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _claim(cache_key, fingerprint):
+    """
+    Claim the key, or return the stored entry of an earlier request with it.
+
+    Waits briefly while another request holding the key is still running, so
+    concurrent duplicates collapse into one write. That only holds across
+    workers with a cache they share.
+    """
+    deadline = time.monotonic() + DUPLICATE_WAIT
+    while True:
+        if cache.add(
+            cache_key,
+            {"state": "in_flight", "fingerprint": fingerprint},
+            IN_FLIGHT_TIMEOUT,
+        ):
+            return None
+        stored = cache.get(cache_key)
+        # None: the entry expired or was evicted since `add`; claim it again.
+        if stored is not None:
+            if stored["fingerprint"] != fingerprint:
+                raise IdempotencyKeyReused()
+            if stored["state"] == "done":
+                return stored
+        if time.monotonic() >= deadline:
+            raise IdempotencyKeyInFlight()
+        time.sleep(POLL_INTERVAL)
+
+
+def idempotent(view_method):
+    """
+    Make a view method safe to retry with an `Idempotency-Key` header.
+
+    The first successful response is stored in the cache per user and key;
+    a retry with the same key and request gets the stored response back,
+    marked with `Idempotent-Replayed: true`, without running the view again.
+    Requests without the header are not affected.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            raise ValidationError(
+                f"The 'Idempotency-Key' header must be at most {MAX_KEY_LENGTH} "
+                "characters."
+            )
+
+        cache_key = _cache_key(request, key)
+        fingerprint = _fingerprint(request)
+        stored = _claim(cache_key, fingerprint)
+        if stored is not None:
+            return Response(
+                stored["data"],
+                status=stored["status"],
+                headers={**stored["headers"], "Idempotent-Replayed": "true"},
+            )
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            # Errors are not stored: the retry runs the request again.
+            cache.delete(cache_key)
+            raise
+        if not status.is_success(response.status_code):
+            cache.delete(cache_key)
+            return response
+        cache.set(
+            cache_key,
+            {
+                "state": "done",
+                "fingerprint": fingerprint,
+                "status": response.status_code,
+                # Plain JSON types, so any cache backend can store them.
+                "data": json.loads(JSONRenderer().render(response.data)),
+                "headers": {
+                    name: response[name]
+                    for name in ("Location",)
+                    if response.has_header(name)
+                },
+            },
+            IDEMPOTENCY_TTL,
+        )
+        return response
+
+    return wrapper
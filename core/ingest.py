@@ -0,0 +1,167 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError
+
+from .ballots import DailyLimitExceeded, submit_ballots
+from .config import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ballots (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    ballot TEXT NOT NULL UNIQUE,
+    employee_id INTEGER NOT NULL,
+    entries TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    committed_at REAL,
+    error TEXT
+)
+"""
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, tz=timezone.utc).isoformat()
+
+
+class VoteQueue:
+    """
+    Durable, host-local queue of accepted ballots stored in SQLite.
+
+    Web workers append ballots and the `flush_votes` command drains them into
+    PostgreSQL. Each ballot is on disk before the client gets its 202. Every
+    thread uses its own SQLite connection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def db(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=FULL")
+            connection.execute(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def put(self, employee_id, entries):
+        """Append a validated ballot and return its ID."""
+        ballot_id = uuid.uuid4().hex
+        entries = [
+            {"menu_id": entry["menu_id"], "points": entry["points"]}
+            for entry in entries
+        ]
+        self.db.execute(
+            "INSERT INTO ballots (ballot, employee_id, entries, received_at) "
+            "VALUES (?, ?, ?, ?)",
+            (ballot_id, employee_id, json.dumps(entries), time.time()),
+        )
+        return ballot_id
+
+    def get(self, ballot_id):
+        """Return the status of a ballot, or None if it is unknown."""
+        row = self.db.execute(
+            "SELECT employee_id, received_at, committed_at, error "
+            "FROM ballots WHERE ballot = ?",
+            (ballot_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        employee_id, received_at, committed_at, error = row
+        if error is not None:
+            status = "failed"
+        elif committed_at is not None:
+            status = "committed"
+        else:
+            status = "queued"
+        return {
+            "ballot": ballot_id,
+            "employee_id": employee_id,
+            "status": status,
+            "received_at": _timestamp(received_at),
+            "committed_at": _timestamp(committed_at),
+            "error": error,
+        }
+
+    def pending(self, limit):
+        """Return up to `limit` uncommitted ballots, oldest first."""
+        rows = self.db.execute(
+            "SELECT ballot, employee_id, entries FROM ballots "
+            "WHERE committed_at IS NULL AND error IS NULL ORDER BY seq LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [
+            (ballot_id, employee_id, json.loads(entries))
+            for ballot_id, employee_id, entries in rows
+        ]
+
+    def mark_committed(self, ballot_ids):
+        now = time.time()
+        self.db.executemany(
+            "UPDATE ballots SET committed_at = ? WHERE ballot = ?",
+            [(now, ballot_id) for ballot_id in ballot_ids],
+        )
+
+    def mark_failed(self, ballot_id, error):
+        self.db.execute(
+            "UPDATE ballots SET error = ? WHERE ballot = ?", (error, ballot_id)
+        )
+
+    def purge(self, older_than):
+        """Forget committed and failed ballots received before `older_than`."""
+        return self.db.execute(
+            "DELETE FROM ballots WHERE received_at < ? "
+            "AND (committed_at IS NOT NULL OR error IS NOT NULL)",
+            (older_than,),
+        ).rowcount
+
+
+_queues: dict[str, VoteQueue] = {}
+
+
+def get_vote_queue():
+    """Return the queue at the configured path, shared by this process."""
+    path = settings.ingest.queue_path
+    if path not in _queues:
+        _queues[path] = VoteQueue(path)
+    return _queues[path]
+
+
+def flush(queue, batch_size):
+    """
+    Write the next batch of queued ballots to PostgreSQL.
+
+    Returns the number of committed and failed ballots. A batch is committed
+    before it is marked in the queue, so a crash in between replays it, which
+    is harmless: the upsert writes the same points again.
+    """
+    batch = queue.pending(batch_size)
+    if not batch:
+        return 0, 0
+    try:
+        submit_ballots([(employee_id, entries) for _, employee_id, entries in batch])
+    except (IntegrityError, ObjectDoesNotExist, DailyLimitExceeded):
+        # One bad ballot, e.g. for a menu deleted in the meantime, must not
+        # hold back the others.
+        committed = []
+        for ballot_id, employee_id, entries in batch:
+            try:
+                submit_ballots([(employee_id, entries)])
+            except (IntegrityError, ObjectDoesNotExist, DailyLimitExceeded) as exc:
+                queue.mark_failed(ballot_id, str(exc))
+            else:
+                committed.append(ballot_id)
+        queue.mark_committed(committed)
+        return len(committed), len(batch) - len(committed)
+    queue.mark_committed([ballot_id for ballot_id, _, _ in batch])
+    return len(batch), 0
@@ -0,0 +1,119 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .results import read_tally
+
+
+def _read_today():
+    close_old_connections()
+    today = timezone.now().date()
+    return today, read_tally(today, today)
+
+
+def _diff(old_rows, new_rows):
+    old = {row["restaurant"]: row for row in old_rows}
+    new = {row["restaurant"]: row for row in new_rows}
+    changed = [row for key, row in new.items() if old.get(key) != row]
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+
+def format_event(event, data):
+    """Encode one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class ResultsPublisher:
+    """
+    In-process broker that fans today's results out to live subscribers.
+
+    A single task per process recomputes the results when a vote commits in
+    this process (see `notify`) or every `poll_interval` seconds to pick up
+    writes from other processes, and pushes only the changed rows to every
+    subscriber. The cost is one tally read per change, however many
+    dashboards are connected.
+    """
+
+    def __init__(self, reader=_read_today, poll_interval=5.0, queue_size=100):
+        self.reader = reader
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.day = None
+        self.rows = []
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    async def subscribe(self):
+        """Register a subscriber and return its queue and the current snapshot."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self.day, self.rows = await sync_to_async(self.reader)()
+            self._task = loop.create_task(self._run())
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue, {"date": self.day, "results": self.rows}
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def notify(self):
+        """Wake the publisher; safe to call from any thread, e.g. on commit."""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wakeup.set)
+
+    def publish(self, event, data):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # Too slow to keep up; the stream notices and closes.
+                self.subscribers.discard(queue)
+
+    async def _run(self):
+        while self.subscribers:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self.subscribers:
+                break
+            day, rows = await sync_to_async(self.reader)()
+            if day != self.day:
+                self.day, self.rows = day, rows
+                self.publish("snapshot", {"date": day, "results": rows})
+                continue
+            changed, removed = _diff(self.rows, rows)
+            self.rows = rows
+            if changed or removed:
+                self.publish(
+                    "delta", {"date": day, "changed": changed, "removed": removed}
+                )
+
+
+publisher = ResultsPublisher()
+
+
+async def stream_results(heartbeat=15.0):
+    """Yield the current results, then deltas, as Server-Sent Events."""
+    queue, snapshot = await publisher.subscribe()
+    try:
+        yield format_event("snapshot", snapshot)
+        while queue in publisher.subscribers:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(event, data)
+    finally:
+        publisher.unsubscribe(queue)
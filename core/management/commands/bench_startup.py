@@ -0,0 +1,116 @@
+import http.client
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .loadtest import Command as LoadTestCommand
+
+POLL_INTERVAL = 0.01
+SCHEMA_PATH = "/swagger/?format=openapi"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(port, path):
+    """Return the status of GET `path`, or None while nothing listens."""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        connection.request("GET", path, headers={"Host": "localhost"})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    except ConnectionError:
+        return None
+    finally:
+        connection.close()
+
+
+def timed_get(port, path):
+    started = time.perf_counter()
+    status = get(port, path)
+    return status, round((time.perf_counter() - started) * 1000, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Start the server in a fresh process several times and report the time "
+        "from running manage.py to the first served request"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument(
+            "--server",
+            choices=["serve", "runserver"],
+            default="serve",
+            help="Command that starts the server (default: serve, one worker).",
+        )
+        parser.add_argument(
+            "--path",
+            default="/readyz",
+            help="Request that must succeed for the server to count as started.",
+        )
+        parser.add_argument("--timeout", type=float, default=60.0)
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        runs = [self.run_once(options) for _ in range(options["runs"])]
+        report = {
+            "commit": LoadTestCommand().git_commit(),
+            "debug": django_settings.DEBUG,
+            "server": options["server"],
+            "runs": runs,
+            **{
+                f"median_{name}": round(statistics.median(run[name] for run in runs), 1)
+                for name in ("first_response_ms", "schema_first_ms", "schema_warm_ms")
+            },
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as report_file:
+                report_file.write(output + "\n")
+        self.stdout.write(output)
+
+    def run_once(self, options):
+        port = free_port()
+        command = [sys.executable, "manage.py", options["server"]]
+        if options["server"] == "serve":
+            command += ["--bind", f"127.0.0.1:{port}", "--workers", "1"]
+        else:
+            command += [f"127.0.0.1:{port}", "--noreload"]
+
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            while get(port, options["path"]) != 200:
+                if process.poll() is not None:
+                    raise CommandError(f"{' '.join(command)} exited early")
+                if time.perf_counter() - started > options["timeout"]:
+                    raise CommandError(
+                        f"No successful {options['path']} within "
+                        f"{options['timeout']:g} s"
+                    )
+                time.sleep(POLL_INTERVAL)
+            first_response = (time.perf_counter() - started) * 1000
+            _, schema_first = timed_get(port, SCHEMA_PATH)
+            _, schema_warm = timed_get(port, SCHEMA_PATH)
+        finally:
+            process.terminate()
+            process.wait()
+        return {
+            "first_response_ms": round(first_response, 1),
+            "schema_first_ms": schema_first,
+            "schema_warm_ms": schema_warm,
+        }
@@ -1,25 +1,67 @@
+import time
+
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from core.models import Restaurant, Menu, Employee
+from django.db import transaction
+from core.models import DailyTally, Restaurant, Menu, Vote
 
 User = get_user_model()
 
+PROGRESS_INTERVAL = 1.0
+
 
 class Command(BaseCommand):
-    help = "Delete initial data for roles, restaurants, and menus"
-
-    def handle(self, *args, **kwargs):
-        # Delete menus
-        Menu.objects.all().delete()
-        self.stdout.write(self.style.SUCCESS("Deleted all menus"))
-
-        # Delete restaurants
-        Restaurant.objects.all().delete()
-        self.stdout.write(self.style.SUCCESS("Deleted all restaurants"))
-
-        # Delete employees (users created for testing)
-        employees = Employee.objects.all()
-        for employee in employees:
-            employee.user.delete()
-            employee.delete()
-        self.stdout.write(self.style.SUCCESS("Deleted all employees"))
+    help = (
+        "Delete initial data for roles, restaurants, and menus. Rows are deleted "
+        "in primary-key chunks, each in its own short transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Rows deleted per transaction (default: 5000).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the rows that would be deleted.",
+        )
+
+    def handle(self, *args, **options):
+        # Children before parents, so each chunk's cascade has nothing left to
+        # load. An interrupted run can simply be started again.
+        steps = [
+            ("votes", Vote.objects.all()),
+            ("tally rows", DailyTally.objects.all()),
+            ("menus", Menu.objects.all()),
+            ("restaurants", Restaurant.objects.all()),
+            # Deleting the user cascades to the employee.
+            ("employees", User.objects.filter(employee__isnull=False)),
+        ]
+        for label, queryset in steps:
+            total = queryset.count()
+            if options["dry_run"]:
+                self.stdout.write(f"Would delete {total} {label}")
+                continue
+            deleted = self.delete_in_chunks(label, queryset, total, options)
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} {label}"))
+
+    def delete_in_chunks(self, label, queryset, total, options):
+        deleted = 0
+        last_report = time.monotonic()
+        while True:
+            with transaction.atomic():
+                ids = list(
+                    queryset.order_by("pk").values_list("pk", flat=True)[
+                        : options["chunk_size"]
+                    ]
+                )
+                if not ids:
+                    return deleted
+                queryset.model.objects.filter(pk__in=ids).delete()
+            deleted += len(ids)
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                self.stdout.write(f"  {label}: {deleted}/{total}")
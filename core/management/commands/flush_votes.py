@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.config import settings
+from core.ingest import flush, get_vote_queue
+
+PURGE_INTERVAL = 60.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain ballots accepted in LS_INGEST_MODE=queue from the local vote "
+        "queue into PostgreSQL in batches. Run one per host."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when the queue is empty instead of waiting for more.",
+        )
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        queue = get_vote_queue()
+        batch_size = options["batch_size"] or settings.ingest.batch_size
+        last_purge = 0.0
+        try:
+            while True:
+                committed, failed = flush(queue, batch_size)
+                if committed or failed:
+                    self.stdout.write(f"Committed {committed}, failed {failed}")
+                if time.monotonic() - last_purge >= PURGE_INTERVAL:
+                    last_purge = time.monotonic()
+                    queue.purge(time.time() - settings.ingest.retention)
+                if committed + failed < batch_size:
+                    if options["once"]:
+                        return
+                    time.sleep(settings.ingest.flush_interval)
+                    # Drop connections that died or aged out while idle.
+                    close_old_connections()
+        except KeyboardInterrupt:
+            pass
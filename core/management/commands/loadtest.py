@@ -0,0 +1,273 @@
+import http.client
+import json
+import random
+import subprocess
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from core.authentication import issue_token
+from core.synthetic import create_organisation, delete_organisation
+
+DEFAULT_MIX = "menus=50,vote_v1=10,vote_v2=30,results=10"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 2)
+
+
+class InProcessTransport:
+    """Send requests through Django's full handler in this thread."""
+
+    def __init__(self):
+        self.client = Client(SERVER_NAME="localhost")
+
+    def request(self, method, path, headers, body):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        extra = {
+            f"HTTP_{name.upper().replace('-', '_')}": value
+            for name, value in headers.items()
+        }
+        with connection.execute_wrapper(count):
+            response = self.client.generic(
+                method, path, body or "", content_type="application/json", **extra
+            )
+        return response.status_code, queries
+
+
+class HttpTransport:
+    """Send requests to a running server over one keep-alive connection."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80)
+
+    def request(self, method, path, headers, body):
+        self.connection.request(
+            method,
+            path,
+            body=body,
+            headers={**headers, "Content-Type": "application/json"},
+        )
+        response = self.connection.getresponse()
+        response.read()
+        return response.status, None
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate the noon voting spike against a synthetic organisation and "
+        "report throughput, latency percentiles and queries per request"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--employees", type=int, default=1000)
+        parser.add_argument("--restaurants", type=int, default=10)
+        parser.add_argument("--clients", type=int, default=20)
+        parser.add_argument("--duration", type=float, default=30.0)
+        parser.add_argument(
+            "--mix",
+            default=DEFAULT_MIX,
+            help=f"Relative weights of the request types (default: {DEFAULT_MIX}).",
+        )
+        parser.add_argument(
+            "--url",
+            help="Target a running server (e.g. http://localhost:8000) instead "
+            "of calling the app in-process. Queries are not counted then.",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--prefix", default="loadtest")
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument(
+            "--keep-data",
+            action="store_true",
+            help="Keep the synthetic organisation after the run.",
+        )
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options["mix"])
+        prefix = options["prefix"]
+
+        delete_organisation(prefix)
+        org = create_organisation(
+            options["restaurants"],
+            options["employees"],
+            prefix=prefix,
+            seed=options["seed"],
+        )
+        try:
+            report = self.run(org, mix, options)
+        finally:
+            if not options["keep_data"]:
+                delete_organisation(prefix)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as report_file:
+                report_file.write(output + "\n")
+        self.stdout.write(output)
+
+    def parse_mix(self, value):
+        mix = {}
+        for part in value.split(","):
+            name, _, weight = part.partition("=")
+            if name not in ("menus", "vote_v1", "vote_v2", "results"):
+                raise CommandError(f"Unknown request type in --mix: {name!r}")
+            mix[name] = float(weight or 1)
+        return mix
+
+    def run(self, org, mix, options):
+        employee_tokens = [
+            issue_token(employee.user, employee.id) for employee in org.employees
+        ]
+        admin_token = issue_token(org.admin, None)
+        menu_ids = [menu.id for menu in org.menus]
+        # Old and new app users are disjoint groups sized by their weights, and
+        # each vote goes to the next employee of the group, like everyone
+        # voting once at noon. Once a group has voted, its request type leaves
+        # the mix, so that the report times accepted votes rather than 400s.
+        v1_weight = mix.get("vote_v1", 0)
+        v1_share = v1_weight / ((v1_weight + mix.get("vote_v2", 0)) or 1)
+        split = round(len(employee_tokens) * v1_share)
+        voters = {
+            "vote_v1": iter(employee_tokens[:split] or employee_tokens),
+            "vote_v2": iter(employee_tokens[split:] or employee_tokens),
+        }
+        active = dict(mix)
+        exhausted = {}
+        samples = {name: [] for name in mix}
+        lock = threading.Lock()
+        started = time.monotonic()
+        deadline = started + options["duration"]
+
+        def build(name, rng):
+            if name == "menus":
+                token = rng.choice(employee_tokens)
+                return "GET", "/api/menus/today/", {}, None, token
+            if name == "results":
+                return "GET", "/api/votes/results/today/", {}, None, admin_token
+            with lock:
+                token = next(voters[name], None)
+                if token is None:
+                    if active.pop(name, None) is not None:
+                        exhausted[name] = round(time.monotonic() - started, 2)
+                    return None
+            if name == "vote_v1":
+                body = {"menu_id": rng.choice(menu_ids)}
+                return "POST", "/api/votes/", {"Build-Version": "1"}, body, token
+            picks = rng.sample(menu_ids, k=min(3, len(menu_ids)))
+            body = {
+                "votes": [
+                    {"menu_id": menu_id, "points": points}
+                    for points, menu_id in enumerate(picks, start=1)
+                ]
+            }
+            return "POST", "/api/votes/", {"Build-Version": "2"}, body, token
+
+        def worker(index):
+            # random.Random is not thread-safe, so every client gets its own,
+            # seeded from --seed and its index to keep runs reproducible.
+            seed = options["seed"]
+            rng = random.Random(None if seed is None else seed + index)
+            transport = (
+                HttpTransport(options["url"])
+                if options["url"]
+                else InProcessTransport()
+            )
+            local = {name: [] for name in mix}
+            while time.monotonic() < deadline:
+                with lock:
+                    names, weights = list(active), list(active.values())
+                if not names:
+                    break
+                name = rng.choices(names, weights)[0]
+                request = build(name, rng)
+                if request is None:
+                    continue
+                method, path, headers, body, token = request
+                headers = {**headers, "Authorization": f"Bearer {token}"}
+                started = time.perf_counter()
+                status, queries = transport.request(
+                    method, path, headers, json.dumps(body) if body else None
+                )
+                elapsed = (time.perf_counter() - started) * 1000
+                local[name].append((elapsed, status, queries))
+            if not options["url"]:
+                connection.close()
+            with lock:
+                for name, values in local.items():
+                    samples[name].extend(values)
+
+        threads = [
+            threading.Thread(target=worker, args=(index,))
+            for index in range(options["clients"])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        return self.summarize(samples, elapsed, exhausted, options)
+
+    def summarize(self, samples, elapsed, exhausted, options):
+        endpoints = {}
+        total = errors = 0
+        for name, values in samples.items():
+            latencies = sorted(value[0] for value in values)
+            failures = sum(1 for value in values if value[1] >= 400)
+            queries = [value[2] for value in values if value[2] is not None]
+            total += len(values)
+            errors += failures
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": failures,
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "p50_ms": percentile(latencies, 0.50),
+                "p90_ms": percentile(latencies, 0.90),
+                "p99_ms": percentile(latencies, 0.99),
+                "max_ms": percentile(latencies, 1.0),
+                "avg_queries": round(sum(queries) / len(queries), 2)
+                if queries
+                else None,
+            }
+            if name in exhausted:
+                endpoints[name]["voters_exhausted_s"] = exhausted[name]
+        return {
+            "commit": self.git_commit(),
+            "debug": django_settings.DEBUG,
+            "target": options["url"] or "in-process",
+            "employees": options["employees"],
+            "restaurants": options["restaurants"],
+            "clients": options["clients"],
+            "duration_s": round(elapsed, 2),
+            "requests": total,
+            "errors": errors,
+            "throughput_rps": round(total / elapsed, 2),
+            "endpoints": endpoints,
+        }
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
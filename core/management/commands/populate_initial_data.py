@@ -1,6 +1,18 @@
-from django.core.management.base import BaseCommand
+import time
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from core.models import Restaurant, Menu, Employee
+from core.dishes import sync_dishes
+from core.synthetic import (
+    SYNTHETIC_PASSWORD,
+    create_organisation,
+    create_votes,
+    delete_organisation,
+)
 from django.utils import timezone
 
 from faker import Faker
@@ -11,9 +23,91 @@ fake = Faker()
 
 
 class Command(BaseCommand):
-    help = "Populate initial data for roles, restaurants, and menus, including owners"
+    help = (
+        "Populate initial data for roles, restaurants, and menus, including "
+        "owners. With --restaurants or --employees, generate a synthetic "
+        "dataset of that size instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurants", type=int, help="Default: 10.")
+        parser.add_argument("--employees", type=int, help="Default: 100.")
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=1,
+            help="Days of menus, ending today.",
+        )
+        parser.add_argument(
+            "--votes-per-day",
+            type=int,
+            default=0,
+            help="Employees voting each day, one vote each.",
+        )
+        parser.add_argument("--seed", type=int, help="Make the data reproducible.")
+        parser.add_argument(
+            "--prefix",
+            default="synthetic",
+            help="Prefix of the synthetic usernames and restaurant names.",
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Delete an existing synthetic dataset with this prefix first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["restaurants"] is None and options["employees"] is None:
+            self.populate_demo()
+        else:
+            self.populate_synthetic(options)
+
+    def populate_synthetic(self, options):
+        prefix = options["prefix"]
+        if User.objects.filter(username__startswith=f"{prefix}_").exists():
+            if not options["replace"]:
+                raise CommandError(
+                    f'A synthetic dataset with prefix "{prefix}" already exists; '
+                    "pass --replace or choose another --prefix."
+                )
+            delete_organisation(prefix)
+
+        started = time.monotonic()
+        org = create_organisation(
+            options["restaurants"] or 10,
+            options["employees"] or 100,
+            days=options["days"],
+            prefix=prefix,
+            seed=options["seed"],
+        )
+        self.stdout.write(
+            f"Created {len(org.restaurants)} restaurants, {len(org.menus)} menus "
+            f"and {len(org.employees)} employees "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+
+        if options["votes_per_day"]:
+            started = time.monotonic()
+            votes = create_votes(org, options["votes_per_day"], seed=options["seed"])
+            self.stdout.write(
+                f"Created {votes} votes in {time.monotonic() - started:.1f}s"
+            )
+            today = timezone.now().date()
+            call_command(
+                "rebuild_tally",
+                date_from=today - timedelta(days=options["days"] - 1),
+                date_to=today,
+                stdout=self.stdout,
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Synthetic users are "{prefix}_owner", "{prefix}_admin" and '
+                f'"{prefix}_employee_<n>", all with password "{SYNTHETIC_PASSWORD}"'
+            )
+        )
 
-    def handle(self, *args, **kwargs):
+    def populate_demo(self):
         # Create a user to act as a restaurant owner
         owner_data = {
             "username": "restaurant_owner",
@@ -26,8 +120,8 @@ class Command(BaseCommand):
             is_staff=False,
         )
         if created:
-            owner.set_password(owner_data["password"])
-            owner.save()
+            owner.password = make_password(owner_data["password"])
+            owner.save(update_fields=["password"])
             self.stdout.write(
                 self.style.SUCCESS(f'Created owner "{owner_data["username"]}"')
             )
@@ -101,17 +195,19 @@ class Command(BaseCommand):
             # Create menus for today and for the next 3 days
             for i in range(4):
                 menu_items_today = random.sample(menu_items[restaurant.name], k=3)
-                Menu.objects.get_or_create(
+                menu, created = Menu.objects.get_or_create(
                     restaurant=restaurant,
                     date=menu_date,
                     defaults={"items": ", ".join(menu_items_today)},
                 )
+                if created:
+                    sync_dishes(menu)
                 self.stdout.write(
                     self.style.SUCCESS(
                         f'Created menu for "{restaurant.name}" on {menu_date} with items: {", ".join(menu_items_today)}'
                     )
                 )
-                menu_date += timezone.timedelta(days=1)
+                menu_date += timedelta(days=1)
 
         # Create employees with different roles and departments
         employee_data = [
@@ -141,6 +237,8 @@ class Command(BaseCommand):
             },
         ]
 
+        # Every demo employee shares a password, so hash it only once.
+        employee_password = make_password("securepassword123")
         for data in employee_data:
             user, created = User.objects.get_or_create(
                 username=data["username"],
@@ -148,8 +246,8 @@ class Command(BaseCommand):
                 is_staff=False,
             )
             if created:
-                user.set_password(data["password"])
-                user.save()
+                user.password = employee_password
+                user.save(update_fields=["password"])
                 Employee.objects.get_or_create(user=user, department=data["department"])
                 self.stdout.write(
                     self.style.SUCCESS(
@@ -0,0 +1,79 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from core.models import DailyTally, Vote
+from core.tally import queryset_deltas
+
+
+class Command(BaseCommand):
+    help = "Rebuild or verify the daily vote tally from raw Vote rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date-from", type=date.fromisoformat)
+        parser.add_argument("--date-to", type=date.fromisoformat)
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only compare the tally with the votes; fail on mismatches.",
+        )
+
+    def handle(self, *args, **options):
+        date_from, date_to = options["date_from"], options["date_to"]
+        votes = Vote.objects.all()
+        tallies = DailyTally.objects.all()
+        if date_from:
+            votes = votes.filter(menu__date__gte=date_from)
+            tallies = tallies.filter(date__gte=date_from)
+        if date_to:
+            votes = votes.filter(menu__date__lte=date_to)
+            tallies = tallies.filter(date__lte=date_to)
+
+        if options["verify"]:
+            self.verify(votes, tallies)
+            return
+
+        with transaction.atomic():
+            deleted, _ = tallies.delete()
+            rows = [
+                DailyTally(
+                    date=day, restaurant_id=restaurant_id, points=points, votes=count
+                )
+                for (day, restaurant_id), (points, count) in queryset_deltas(
+                    votes
+                ).items()
+            ]
+            DailyTally.objects.bulk_create(rows, batch_size=1000)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Replaced {deleted} tally rows with {len(rows)} rebuilt rows"
+            )
+        )
+
+    def verify(self, votes, tallies):
+        expected = queryset_deltas(votes)
+        actual = {
+            (day, restaurant_id): (points, count)
+            for day, restaurant_id, points, count in tallies.values(
+                "date", "restaurant_id"
+            )
+            .annotate(total_points=Sum("points"), total_votes=Sum("votes"))
+            .values_list("date", "restaurant_id", "total_points", "total_votes")
+            if points or count
+        }
+        mismatches = sorted(
+            key
+            for key in expected.keys() | actual.keys()
+            if expected.get(key, (0, 0)) != actual.get(key, (0, 0))
+        )
+        for day, restaurant_id in mismatches:
+            self.stdout.write(
+                f"{day} restaurant {restaurant_id}: "
+                f"votes say {expected.get((day, restaurant_id), (0, 0))}, "
+                f"tally says {actual.get((day, restaurant_id), (0, 0))}"
+            )
+        if mismatches:
+            raise CommandError(f"Tally differs from votes for {len(mismatches)} keys")
+        self.stdout.write(self.style.SUCCESS("Tally matches votes"))
@@ -0,0 +1,105 @@
+import multiprocessing
+import tempfile
+
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.urls import get_resolver
+from gunicorn.app.base import BaseApplication
+
+from core.cache import LOCAL_BOARD_TIMEOUT
+from core.config import settings
+from core.metrics import clear_snapshots
+from core.schema import CachedSchemaGenerator
+from lunch_service.urls import api_info
+
+
+def gunicorn_options(server):
+    """Translate the `core.config.Server` settings into gunicorn options."""
+    return {
+        "bind": server.bind,
+        "workers": server.workers or multiprocessing.cpu_count() * 2 + 1,
+        "worker_class": "uvicorn.workers.UvicornWorker" if server.asgi else "sync",
+        "preload_app": True,
+        "timeout": server.timeout,
+        "graceful_timeout": server.graceful_timeout,
+        "keepalive": server.keepalive,
+        "max_requests": server.max_requests,
+        "max_requests_jitter": server.max_requests_jitter,
+        "accesslog": "-",
+    }
+
+
+class Application(BaseApplication):
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+class Command(BaseCommand):
+    help = "Serve the API with a pre-forking multi-worker gunicorn server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bind", help="Override LS_SERVER_BIND.")
+        parser.add_argument("--workers", type=int, help="Override LS_SERVER_WORKERS.")
+
+    def handle(self, *args, **options):
+        if django_settings.DEBUG:
+            self.stderr.write(
+                self.style.WARNING(
+                    "DEBUG is on; use --settings=lunch_service.settings_production"
+                )
+            )
+        server = settings.server.model_copy(
+            update={
+                key: options[key]
+                for key in ("bind", "workers")
+                if options[key] is not None
+            }
+        )
+        if server.asgi:
+            from lunch_service.asgi import application
+        else:
+            from lunch_service.wsgi import application  # type: ignore
+
+        # Import URLconf and views and build the API schema once in the master
+        # so workers fork with them loaded, and make sure no database
+        # connection is shared across forks.
+        get_resolver().url_patterns
+        CachedSchemaGenerator(api_info).get_schema(public=True)
+        connections.close_all()
+
+        gunicorn = gunicorn_options(server)
+        if settings.metrics.enabled and gunicorn["workers"] > 1:
+            # Workers share their counters through files so that /metrics,
+            # answered by any one of them, reports the whole server.
+            if not settings.metrics.dir:
+                settings.metrics.dir = tempfile.mkdtemp(prefix="lunch-metrics-")
+            clear_snapshots()
+        if gunicorn["workers"] > 1 and settings.cache.backend.endswith(".LocMemCache"):
+            if settings.cache.board_timeout is None:
+                settings.cache.board_timeout = LOCAL_BOARD_TIMEOUT
+            self.stderr.write(
+                self.style.WARNING(
+                    "Each worker has its own local-memory cache: Idempotency-Key "
+                    "retries and read-replica pins only hold within a worker, and "
+                    "other workers serve a changed menu board for up to "
+                    f"{settings.cache.board_timeout} s. "
+                    "Set LS_CACHE_BACKEND to a shared cache such as Redis."
+                )
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Serving on {gunicorn['bind']} with {gunicorn['workers']} "
+                f"{gunicorn['worker_class']} workers"
+            )
+        )
+        Application(application, gunicorn).run()
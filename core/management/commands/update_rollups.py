@@ -0,0 +1,36 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from core.rollups import changed_days, rollup_days, voting_days
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll up votes per day, restaurant and department for the analytics "
+        "API, recomputing only days that are new or changed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date-from", type=date.fromisoformat)
+        parser.add_argument("--date-to", type=date.fromisoformat)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute every day in the range, changed or not.",
+        )
+        parser.add_argument(
+            "--chunk-days",
+            type=int,
+            default=31,
+            help="Days recomputed per transaction (default: 31).",
+        )
+
+    def handle(self, *args, **options):
+        date_from, date_to = options["date_from"], options["date_to"]
+        find_days = voting_days if options["all"] else changed_days
+        days = find_days(date_from, date_to)
+        chunk = options["chunk_days"]
+        for start in range(0, len(days), chunk):
+            rollup_days(days[start : start + chunk])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {len(days)} days"))
@@ -0,0 +1,489 @@
+"""
+Per-view request metrics in the Prometheus text format.
+
+MetricsMiddleware records, for every view action and HTTP method, requests by
+status class, a latency histogram, SQL queries, SQL time and render time.
+The counters are plain attributes of per-process objects that are only ever
+incremented, without locks; a request costs a dictionary lookup, a small
+SQL counter object and a few additions. Streamed response bodies are not
+included in the timings.
+
+With `LS_METRICS_DIR` set, each worker also saves its counters there at most
+every `LS_METRICS_FLUSH_INTERVAL` seconds, and /metrics adds up all workers.
+Files are named by a random ID per process, as PIDs get reused. The counters
+of workers that have exited, e.g. recycled after `max_requests`, are merged
+into one `exited.json`, so the directory does not grow with every restart.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import fcntl
+import json
+import os
+import resource
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+
+from .config import settings
+
+# Upper bounds of the latency histogram buckets, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+_stats: dict = {}
+_state: dict = {
+    "started_at": time.time(),
+    "flushed_at": 0.0,
+    "worker": uuid.uuid4().hex,
+}
+EXITED = "exited"
+
+
+class ViewStats:
+    __slots__ = (
+        "view",
+        "method",
+        "statuses",
+        "buckets",
+        "seconds",
+        "queries",
+        "sql_seconds",
+        "render_seconds",
+    )
+
+    def __init__(self, view, method):
+        self.view = view
+        self.method = method
+        # Requests by status class: 1xx to 5xx.
+        self.statuses = [0] * 5
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.seconds = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+
+    def observe(self, status, seconds, queries, sql_seconds, render_seconds):
+        self.statuses[min(max(status // 100, 1), 5) - 1] += 1
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.seconds += seconds
+        self.queries += queries
+        self.sql_seconds += sql_seconds
+        self.render_seconds += render_seconds
+
+
+def _reset_after_fork():
+    # Forked workers start with their own counters and start time.
+    _stats.clear()
+    _state["started_at"] = time.time()
+    _state["flushed_at"] = 0.0
+    _state["worker"] = uuid.uuid4().hex
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def view_label(func, method):
+    """Name a view like `VoteViewSet.create`, from its resolver match function."""
+    if func is None:
+        return "unmatched"
+    cls = getattr(func, "cls", None)
+    if cls is None:
+        return getattr(func, "__name__", type(func).__name__)
+    actions = getattr(func, "actions", None) or {}
+    return f"{cls.__name__}.{actions.get(method.lower(), method.lower())}"
+
+
+def stats_for(func, method):
+    if method not in METHODS:
+        method = "OTHER"
+    by_method = _stats.get(func)
+    if by_method is None:
+        by_method = _stats.setdefault(func, {})
+    stats = by_method.get(method)
+    if stats is None:
+        stats = by_method.setdefault(
+            method, ViewStats(view_label(func, method), method)
+        )
+    return stats
+
+
+class SQLCounter:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# The counter of the current request. A context variable rather than a
+# connection attribute, because under ASGI the view's queries run on a
+# connection that belongs to a worker thread's copy of the context.
+_sql_counter: contextvars.ContextVar = contextvars.ContextVar(
+    "metrics_sql_counter", default=None
+)
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = _sql_counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counter.queries += 1
+        counter.seconds += time.perf_counter() - started
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """`connection_created` receiver that makes a connection count its queries."""
+    if _count_query not in connection.execute_wrappers:
+        # First, so that `execute_wrapper()` blocks that are open now can still
+        # pop their own wrapper off the end.
+        connection.execute_wrappers.insert(0, _count_query)
+
+
+def _rendered(response):
+    response.metrics_render_seconds = (
+        time.perf_counter() - response.metrics_render_started
+    )
+
+
+class MetricsMiddleware:
+    """Record the metrics of every request; see `core.metrics`."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.metrics.enabled:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            # Django would otherwise run the sync hook in a worker thread.
+            self.process_template_response = self._aprocess_template_response  # type: ignore[method-assign]
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        counter = SQLCounter()
+        token = _sql_counter.set(counter)
+        try:
+            response = self.get_response(request)
+        finally:
+            _sql_counter.reset(token)
+        self.record(request, response, started, counter)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        counter = SQLCounter()
+        token = _sql_counter.set(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _sql_counter.reset(token)
+        self.record(request, response, started, counter)
+        return response
+
+    def process_template_response(self, request, response):
+        response.metrics_render_started = time.perf_counter()
+        response.add_post_render_callback(_rendered)
+        return response
+
+    async def _aprocess_template_response(self, request, response):
+        return MetricsMiddleware.process_template_response(self, request, response)
+
+    def record(self, request, response, started, counter):
+        now = time.perf_counter()
+        match = request.resolver_match
+        stats_for(match.func if match else None, request.method).observe(
+            response.status_code,
+            now - started,
+            counter.queries,
+            counter.seconds,
+            getattr(response, "metrics_render_seconds", 0.0),
+        )
+        if settings.metrics.dir and (
+            now - _state["flushed_at"] >= settings.metrics.flush_interval
+        ):
+            _state["flushed_at"] = now
+            save_snapshot()
+
+
+def process_stats():
+    """Return CPU, memory, file descriptor and thread figures of this process."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    stats = {
+        "cpu_seconds": usage.ru_utime + usage.ru_stime,
+        "threads": threading.active_count(),
+        "start_time": _state["started_at"],
+    }
+    try:
+        with open("/proc/self/statm") as statm:
+            stats["resident_memory_bytes"] = int(statm.read().split()[1]) * PAGE_SIZE
+        stats["open_fds"] = len(os.listdir("/proc/self/fd"))
+    except OSError:
+        pass
+    return stats
+
+
+def snapshot():
+    """Return the counters and process stats of this worker."""
+    return {
+        "worker": _state["worker"],
+        "pid": os.getpid(),
+        "views": [
+            [
+                stats.view,
+                stats.method,
+                stats.statuses,
+                stats.buckets,
+                stats.seconds,
+                stats.queries,
+                stats.sql_seconds,
+                stats.render_seconds,
+            ]
+            for by_method in list(_stats.values())
+            for stats in list(by_method.values())
+        ],
+        "process": process_stats(),
+    }
+
+
+def save_snapshot():
+    directory = Path(settings.metrics.dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    _write(directory / f"{_state['worker']}.json", snapshot())
+
+
+def _write(path, saved):
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(saved))
+    os.replace(temporary, path)
+
+
+@contextlib.contextmanager
+def _locked(directory, operation):
+    """Hold a lock on the metrics directory; yield False if it was busy."""
+    with open(directory / ".lock", "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, operation)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def clear_snapshots():
+    """Delete the saved counters of earlier workers, e.g. when a server starts."""
+    directory = Path(settings.metrics.dir)
+    if directory.is_dir():
+        for path in directory.glob("*.json"):
+            path.unlink(missing_ok=True)
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read(directory):
+    """Return the snapshots saved in `directory` by other workers."""
+    snapshots = []
+    for path in directory.glob("*.json"):
+        if path.stem == _state["worker"]:
+            continue
+        try:
+            snapshots.append((path, json.loads(path.read_text())))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _add_views(total, views):
+    """Add the view counters of a snapshot into `total`, keyed by view and method."""
+    for view, method, statuses, buckets, *sums in views:
+        counters = total.setdefault(
+            (view, method), [[0] * 5, [0] * (len(BUCKETS) + 1), 0.0, 0, 0.0, 0.0]
+        )
+        counters[0] = [a + b for a, b in zip(counters[0], statuses)]
+        counters[1] = [a + b for a, b in zip(counters[1], buckets)]
+        for index, value in enumerate(sums, start=2):
+            counters[index] += value
+    return total
+
+
+def merge_exited(directory):
+    """
+    Fold the snapshots of exited workers into `exited.json` and delete them.
+
+    A worker counts as exited when its PID is gone, or has been taken by a
+    worker that started later. Skipped while another worker is merging.
+    """
+    with _locked(directory, fcntl.LOCK_EX | fcntl.LOCK_NB) as locked:
+        if not locked:
+            return
+        snapshots = _read(directory)
+        workers = [
+            (path, saved, saved["process"].get("start_time", 0.0))
+            for path, saved in snapshots
+            if saved.get("worker") != EXITED
+        ]
+        latest = {os.getpid(): _state["started_at"]}
+        for _, saved, started in workers:
+            latest[saved["pid"]] = max(latest.get(saved["pid"], started), started)
+        exited = [
+            (path, saved)
+            for path, saved, started in workers
+            if started < latest[saved["pid"]] or not _is_alive(saved["pid"])
+        ]
+        if not exited:
+            return
+        total: dict = {}
+        for path, saved in snapshots:
+            if saved.get("worker") == EXITED:
+                _add_views(total, saved["views"])
+        for _, saved in exited:
+            _add_views(total, saved["views"])
+        _write(
+            directory / f"{EXITED}.json",
+            {
+                "worker": EXITED,
+                "pid": None,
+                "views": [[*key, *counters] for key, counters in total.items()],
+                "process": None,
+            },
+        )
+        for path, _ in exited:
+            path.unlink(missing_ok=True)
+
+
+def collect():
+    """Return the snapshots of all workers, this one first."""
+    snapshots = [snapshot()]
+    if settings.metrics.dir:
+        directory = Path(settings.metrics.dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        merge_exited(directory)
+        # Shared, so that a merge never runs between reading the merged
+        # counters and reading a worker's own file.
+        with _locked(directory, fcntl.LOCK_SH):
+            for _, saved in _read(directory):
+                # Left over while another worker was merging; its counters
+                # still count, its process stats don't.
+                if saved["pid"] is not None and not _is_alive(saved["pid"]):
+                    saved["process"] = None
+                snapshots.append(saved)
+    return snapshots
+
+
+def _labels(**labels):
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def render_metrics(snapshots=None):
+    """Render the metrics of `snapshots` (all workers by default) as text."""
+    if snapshots is None:
+        snapshots = collect()
+    views: dict = {}
+    for saved in snapshots:
+        _add_views(views, saved["views"])
+
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    family(
+        "lunch_http_requests_total",
+        "counter",
+        "Requests by view action, method and status class.",
+    )
+    for (view, method), (statuses, *_) in sorted(views.items()):
+        for index, count in enumerate(statuses, start=1):
+            if count:
+                labels = _labels(view=view, method=method, status=f"{index}xx")
+                lines.append(f"lunch_http_requests_total{{{labels}}} {count}")
+
+    family(
+        "lunch_http_request_duration_seconds",
+        "histogram",
+        "Time to the response headers, by view action and method.",
+    )
+    for (view, method), (_, buckets, seconds, *_) in sorted(views.items()):
+        labels = _labels(view=view, method=method)
+        cumulative = 0
+        for bound, count in zip((*BUCKETS, "+Inf"), buckets):
+            cumulative += count
+            lines.append(
+                f'lunch_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} '
+                f"{cumulative}"
+            )
+        lines.append(f"lunch_http_request_duration_seconds_sum{{{labels}}} {seconds}")
+        lines.append(
+            f"lunch_http_request_duration_seconds_count{{{labels}}} {cumulative}"
+        )
+
+    for name, index, help_text in (
+        ("lunch_db_queries_total", 3, "SQL queries, by view action and method."),
+        (
+            "lunch_db_query_seconds_total",
+            4,
+            "Time spent in SQL queries, by view action and method.",
+        ),
+        (
+            "lunch_render_seconds_total",
+            5,
+            "Time spent rendering response bodies, by view action and method.",
+        ),
+    ):
+        family(name, "counter", help_text)
+        for (view, method), total in sorted(views.items()):
+            labels = _labels(view=view, method=method)
+            lines.append(f"{name}{{{labels}}} {total[index]}")
+
+    processes = [saved for saved in snapshots if saved["process"] is not None]
+    family("lunch_workers", "gauge", "Worker processes reporting metrics.")
+    lines.append(f"lunch_workers {len(processes)}")
+    for name, key, kind, help_text in (
+        ("process_cpu_seconds_total", "cpu_seconds", "counter", "CPU time."),
+        (
+            "process_resident_memory_bytes",
+            "resident_memory_bytes",
+            "gauge",
+            "Resident memory.",
+        ),
+        ("process_open_fds", "open_fds", "gauge", "Open file descriptors."),
+        ("process_threads", "threads", "gauge", "Python threads."),
+        (
+            "process_start_time_seconds",
+            "start_time",
+            "gauge",
+            "Start time since the Unix epoch.",
+        ),
+    ):
+        family(name, kind, f"{help_text} Per worker process.")
+        for saved in processes:
+            if key in saved["process"]:
+                lines.append(f'{name}{{pid="{saved["pid"]}"}} {saved["process"][key]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_tally(apps, schema_editor):
+    # The same grouped query as `rebuild_tally`, against the historical models,
+    # so that results of existing votes show up as soon as the tally is read.
+    Vote = apps.get_model("core", "Vote")
+    DailyTally = apps.get_model("core", "DailyTally")
+    rows = (
+        Vote.objects.order_by()
+        .values("menu__date", "menu__restaurant_id")
+        .annotate(total_points=Sum("points"), total_votes=Count("id"))
+        .values_list("menu__date", "menu__restaurant_id", "total_points", "total_votes")
+    )
+    DailyTally.objects.bulk_create(
+        (
+            DailyTally(
+                date=day, restaurant_id=restaurant_id, points=points, votes=count
+            )
+            for day, restaurant_id, points, count in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyTally",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("shard", models.PositiveSmallIntegerField(default=0)),
+                ("points", models.IntegerField(default=0)),
+                ("votes", models.IntegerField(default=0)),
+                (
+                    "restaurant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tallies",
+                        to="core.restaurant",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("date", "restaurant", "shard")},
+            },
+        ),
+        migrations.RunPython(backfill_tally, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0002_dailytally"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="menu",
+            index=models.Index(fields=["date", "id"], name="core_menu_date_7f3ea8_idx"),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0003_menu_date_id_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="menu",
+            index=models.Index(
+                fields=["date", "restaurant"], name="core_menu_date_32dd29_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="vote",
+            index=models.Index(
+                fields=["menu", "id"], name="core_vote_menu_id_7377b5_idx"
+            ),
+        ),
+    ]
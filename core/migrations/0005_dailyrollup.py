@@ -0,0 +1,42 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0004_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("department", models.CharField(max_length=255)),
+                ("points", models.IntegerField(default=0)),
+                ("votes", models.IntegerField(default=0)),
+                (
+                    "restaurant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rollups",
+                        to="core.restaurant",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("date", "restaurant", "department")},
+            },
+        ),
+    ]
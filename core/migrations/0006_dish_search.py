@@ -0,0 +1,105 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:07
+
+import core.models
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_dishes(apps, schema_editor):
+    from core.dishes import parse_items
+
+    Dish = apps.get_model("core", "Dish")
+    Menu = apps.get_model("core", "Menu")
+    batch = []
+    for menu_id, items in Menu.objects.values_list("id", "items").iterator():
+        batch.extend(
+            Dish(
+                menu_id=menu_id,
+                name=name,
+                description=description,
+                tags=tags,
+                allergens=allergens,
+            )
+            for name, description, tags, allergens in parse_items(items)
+        )
+        if len(batch) >= 5000:
+            Dish.objects.bulk_create(batch)
+            batch = []
+    Dish.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0005_dailyrollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Dish",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("description", models.TextField(blank=True, default="")),
+                (
+                    "tags",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=50),
+                        blank=True,
+                        default=list,
+                        size=None,
+                    ),
+                ),
+                (
+                    "allergens",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=50),
+                        blank=True,
+                        default=list,
+                        size=None,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="menu",
+            index=django.contrib.postgres.indexes.GinIndex(
+                core.models.ItemsDocument(), name="core_menu_items_search_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="dish",
+            name="menu",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="dishes",
+                to="core.menu",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dish",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector(
+                    "name", "description", config="simple"
+                ),
+                name="core_dish_search_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dish",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["tags"], name="core_dish_tags_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_dishes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:57
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+from django.db.models import Func, Value
+from django.db.models.functions import Concat, Trim
+
+
+def backfill_labels(apps, schema_editor):
+    Dish = apps.get_model("core", "Dish")
+    Dish.objects.update(
+        labels=Trim(
+            Concat(
+                Func(
+                    "tags",
+                    Value(" "),
+                    function="array_to_string",
+                    output_field=models.TextField(),
+                ),
+                Value(" "),
+                Func(
+                    "allergens",
+                    Value(" "),
+                    function="array_to_string",
+                    output_field=models.TextField(),
+                ),
+                output_field=models.TextField(),
+            )
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0006_dish_search"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="dish",
+            name="core_dish_search_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="dish",
+            name="core_dish_tags_idx",
+        ),
+        migrations.AddField(
+            model_name="dish",
+            name="labels",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.RunPython(backfill_labels, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="dish",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector(
+                    "name", "description", "labels", config="simple"
+                ),
+                name="core_dish_search_idx",
+            ),
+        ),
+    ]
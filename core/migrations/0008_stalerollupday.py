@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0007_dish_labels"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StaleRollupDay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(unique=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+from rest_framework.response import Response
+
+from .replicas import pin_after_write, read_from_primary, read_from_replica
+
+
+class ValuesListMixin:
+    """
+    Serve `list` from `.values()` rows instead of serialized model instances.
+
+    Every name in the serializer's `Meta.fields` must be a concrete model field
+    (foreign keys render as their ID), so each row is exactly what the
+    serializer would have produced, key for key and in the same order.
+    """
+
+    def list(self, request, *args, **kwargs):
+        fields = self.get_serializer_class().Meta.fields
+        queryset = self.filter_queryset(self.get_queryset()).values(*fields)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(list(queryset))
+
+
+class ReplicaReadMixin:
+    """
+    Read from a replica in safe requests; see `core.replicas`.
+
+    Authentication and permission checks still read from the primary. After a
+    successful write, the user is pinned to the primary.
+    """
+
+    replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.replica_token = read_from_replica(request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        read_from_primary(self.replica_token)
+        self.replica_token = None
+        pin_after_write(request, response)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -1,3 +1,6 @@
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
 
 # Create your models here.
@@ -20,6 +23,19 @@ class Restaurant(models.Model):
         return self.name
 
 
+class ItemsDocument(models.Func):
+    """Full-text document of every key and string value in `Menu.items`."""
+
+    template = (
+        "jsonb_to_tsvector('simple'::regconfig, %(expressions)s, "
+        '\'["string", "key"]\'::jsonb)'
+    )
+    output_field = SearchVectorField()
+
+    def __init__(self, **extra):
+        super().__init__(models.F("items"), **extra)
+
+
 class Menu(models.Model):
     restaurant = models.ForeignKey(
         Restaurant, related_name="menus", on_delete=models.CASCADE
@@ -27,6 +43,13 @@ class Menu(models.Model):
     date = models.DateField()
     items = models.JSONField()  # Store menu items as a JSON object
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["date", "id"]),
+            models.Index(fields=["date", "restaurant"]),
+            GinIndex(ItemsDocument(), name="core_menu_items_search_idx"),
+        ]
+
     def __str__(self):
         return f"{self.restaurant.name} - {self.date}"
 
@@ -53,3 +76,84 @@ class Vote(models.Model):
             "employee",
             "menu",
         )  # Ensure each employee can vote only once per menu
+        indexes = [models.Index(fields=["menu", "id"])]
+
+
+class DailyTally(models.Model):
+    """
+    Running vote totals per day and restaurant.
+
+    Counters are split across several shard rows so concurrent votes for the
+    same restaurant do not all contend for one row; readers sum the shards.
+    """
+
+    date = models.DateField()
+    restaurant = models.ForeignKey(
+        Restaurant, related_name="tallies", on_delete=models.CASCADE
+    )
+    shard = models.PositiveSmallIntegerField(default=0)
+    points = models.IntegerField(default=0)
+    votes = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("date", "restaurant", "shard")
+
+
+class DailyRollup(models.Model):
+    """
+    Vote totals per day, restaurant and employee department for reporting.
+
+    Maintained by the `update_rollups` command, which recomputes only the days
+    whose tally no longer matches the rollup, and the days marked stale by a
+    department change.
+    """
+
+    date = models.DateField()
+    restaurant = models.ForeignKey(
+        Restaurant, related_name="rollups", on_delete=models.CASCADE
+    )
+    department = models.CharField(max_length=255)
+    points = models.IntegerField(default=0)
+    votes = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("date", "restaurant", "department")
+
+
+class StaleRollupDay(models.Model):
+    """
+    A day whose rollup must be recomputed although its totals are unchanged.
+
+    Marked when an employee who voted that day changes department, which moves
+    points between departments without touching the tally.
+    """
+
+    date = models.DateField(unique=True)
+
+
+class Dish(models.Model):
+    """
+    One dish of a menu, normalized from `Menu.items` for search.
+
+    Kept in sync with the items whenever a menu is written.
+    """
+
+    menu = models.ForeignKey(Menu, related_name="dishes", on_delete=models.CASCADE)
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True, default="")
+    tags = ArrayField(models.CharField(max_length=50), blank=True, default=list)
+    allergens = ArrayField(models.CharField(max_length=50), blank=True, default=list)
+    # The tags and allergens as words, so that full-text search, including its
+    # negation, covers them.
+    labels = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            GinIndex(
+                SearchVector("name", "description", "labels", config="simple"),
+                name="core_dish_search_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,118 @@
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.utils.urls import replace_query_param
+
+
+def _past(ordering, position, reverse):
+    """
+    Match the rows that come after `position` in `ordering`, or before it.
+
+    `(date, id) > (d, i)` is spelled `date > d OR (date = d AND id > i)`, which
+    PostgreSQL answers with range scans of an index on the ordering.
+    """
+    condition = Q()
+    equal = Q()
+    for order, value in zip(ordering, position):
+        field = order.lstrip("-")
+        lookup = "lt" if order.startswith("-") != reverse else "gt"
+        condition |= equal & Q(**{f"{field}__{lookup}": value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over an indexed ordering.
+
+    The cursor holds the whole key of the row at the edge of a page, so the
+    next page is a `WHERE (date, id) > cursor LIMIT n` range scan with no
+    OFFSET and no `COUNT(*)`; a deep page costs the same as the first one.
+    Views pick their ordering with a `cursor_ordering` attribute, whose last
+    field must be unique and none of whose fields may be null.
+    """
+
+    ordering = ("id",)
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, "cursor_ordering", self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.position, reverse = self.decode_cursor(request)
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if self.position is not None:
+            try:
+                queryset = queryset.filter(_past(self.ordering, self.position, reverse))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # One extra row tells whether there is a page beyond this one.
+        rows = list(queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = self.position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._position(self.page[-1]) if self.page else self.position
+        return self.encode_cursor((position, False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._position(self.page[0]) if self.page else self.position
+        return self.encode_cursor((position, True))
+
+    def decode_cursor(self, request):
+        """Return the position and direction of the request's cursor."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            querystring = b64decode(encoded.encode("ascii")).decode("ascii")
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            reverse = bool(int(tokens.get("r", ["0"])[0]))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        position = tokens.get("p")
+        if position is None or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, cursor):
+        position, reverse = cursor
+        tokens = {"p": position}
+        if reverse:
+            tokens["r"] = "1"
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _position(self, row):
+        fields = [order.lstrip("-") for order in self.ordering]
+        if isinstance(row, dict):
+            return [str(row[field]) for field in fields]
+        return [str(getattr(row, field)) for field in fields]
@@ -1,25 +1,56 @@
+from django.contrib.auth.models import User
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from .authentication import TokenUser
+from .models import Employee
+from .principal import get_principal
+
+
+def is_staff(user):
+    """Whether `user` is an active admin, re-checking the claim of a token user."""
+    if not user.is_authenticated or not user.is_staff:
+        return False
+    if not isinstance(user, TokenUser):
+        return True
+    # Admin rights are rare and valuable enough for one query per request.
+    if getattr(user, "staff_confirmed", None) is None:
+        user.staff_confirmed = User.objects.filter(
+            pk=user.pk, is_staff=True, is_active=True
+        ).exists()
+    return user.staff_confirmed
+
 
 class IsAdmin(BasePermission):
     """Permission class to allow only admins."""
 
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.is_staff
+        return is_staff(request.user)
 
 
 class IsRestaurant(BasePermission):
     """Permission class to allow only restaurant users to create/update menus."""
 
     def has_permission(self, request, view):
-        return request.user.is_authenticated and hasattr(request.user, "restaurant")
+        return request.user.is_authenticated and bool(
+            get_principal(request).restaurant_ids
+        )
 
 
 class IsEmployee(BasePermission):
     """Permission class to allow only employees to vote."""
 
     def has_permission(self, request, view):
-        return request.user.is_authenticated and hasattr(request.user, "employee")
+        if not request.user.is_authenticated:
+            return False
+        employee_id = get_principal(request).employee_id
+        if employee_id is None:
+            return False
+        if isinstance(request.user, TokenUser):
+            # The token's employee may have been deleted or its user deactivated.
+            return Employee.objects.filter(
+                pk=employee_id, user_id=request.user.pk, user__is_active=True
+            ).exists()
+        return True
 
 
 class ReadOnly(BasePermission):
@@ -34,7 +65,8 @@ class IsVoteOwner(BasePermission):
 
     def has_object_permission(self, request, view, obj):
         # Only the employee who created the vote can modify it
-        return obj.employee.user == request.user
+        employee_id = get_principal(request).employee_id
+        return employee_id is not None and obj.employee_id == employee_id
 
 
 class IsRestaurantOwner(BasePermission):
@@ -48,4 +80,4 @@ class IsRestaurantOwner(BasePermission):
 
     def has_object_permission(self, request, view, obj):
         # `obj` here is a Menu instance, so we need to check its related restaurant's owner
-        return obj.restaurant.owner == request.user
+        return obj.restaurant_id in get_principal(request).restaurant_ids
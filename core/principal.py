@@ -0,0 +1,79 @@
+from django.contrib.auth.models import User
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q, Value
+
+from .authentication import TokenUser
+from .models import Restaurant
+
+
+class Principal:
+    """
+    The caller's employee ID and owned restaurant IDs.
+
+    Pass `restaurant_ids=None` to load the restaurants on first use.
+    """
+
+    __slots__ = ("user_id", "employee_id", "_restaurant_ids")
+
+    def __init__(self, user_id, employee_id=None, restaurant_ids=()):
+        self.user_id = user_id
+        self.employee_id = employee_id
+        self._restaurant_ids = (
+            None if restaurant_ids is None else frozenset(restaurant_ids)
+        )
+
+    @property
+    def restaurant_ids(self):
+        if self._restaurant_ids is None:
+            self._restaurant_ids = frozenset(
+                Restaurant.objects.using(DEFAULT_DB_ALIAS)
+                .filter(owner_id=self.user_id)
+                .values_list("id", flat=True)
+            )
+        return self._restaurant_ids
+
+
+def _load(user_id):
+    # From the primary: permissions must not lag behind ownership changes.
+    rows = list(
+        User.objects.using(DEFAULT_DB_ALIAS)
+        .filter(pk=user_id)
+        .values("employee__id")
+        .annotate(
+            restaurant_ids=ArrayAgg(
+                "restaurants__id",
+                distinct=True,
+                filter=Q(restaurants__isnull=False),
+                default=Value([]),
+            )
+        )
+    )
+    if not rows:
+        return Principal(user_id)
+    return Principal(user_id, rows[0]["employee__id"], rows[0]["restaurant_ids"])
+
+
+def get_principal(request):
+    """
+    Resolve the caller's principal once per request.
+
+    The result is memoized on the underlying Django request, so permission
+    checks compare IDs instead of walking relations. It is not kept across
+    requests, so ownership and employee changes apply at once on every worker.
+    """
+    http_request = getattr(request, "_request", request)
+    user = request.user
+    principal = getattr(http_request, "principal", None)
+    if principal is not None and principal.user_id == user.pk:
+        return principal
+
+    if not user.is_authenticated:
+        principal = Principal(None)
+    elif isinstance(user, TokenUser):
+        # The token already carries the employee ID.
+        principal = Principal(user.pk, user.employee_id, restaurant_ids=None)
+    else:
+        principal = _load(user.pk)
+    http_request.principal = principal
+    return principal
@@ -0,0 +1,272 @@
+"""
+Opt-in profiling of single requests.
+
+An admin gets a short-lived signed ticket from `POST /api/profiles/ticket/`
+and sends it as `X-Profile: <ticket>` with the request to diagnose, under any
+user's credentials. ProfilingMiddleware then runs that one request under
+cProfile and tracemalloc while recording its SQL, stores the report in the
+cache and answers with an `X-Profile-Id` header. Requests without the header
+only pay for the header lookup.
+"""
+
+import cProfile
+import contextlib
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.db import connections
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .metrics import view_label
+
+TICKET_SALT = "core.profiling.ticket"
+TICKET_TTL = 10 * 60
+REPORT_TTL = 24 * 60 * 60
+SLOT_COUNTER_KEY = "profiles:slot"
+INDEX_SIZE = 50
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+MAX_STATEMENTS = 200
+MAX_SQL_LENGTH = 2000
+
+# tracemalloc traces the whole process, so one profile at a time per worker.
+_lock = threading.Lock()
+
+
+def issue_ticket(user):
+    """Sign a profile ticket for an admin."""
+    return signing.dumps({"uid": user.pk}, salt=TICKET_SALT)
+
+
+def ticket_is_valid(ticket):
+    """Whether `ticket` is unexpired and its admin is still an active admin."""
+    try:
+        claims = signing.loads(ticket, salt=TICKET_SALT, max_age=TICKET_TTL)
+    except signing.BadSignature:
+        return False
+    return User.objects.filter(
+        pk=claims.get("uid"), is_staff=True, is_active=True
+    ).exists()
+
+
+def _report_key(profile_id):
+    return f"profiles:{profile_id}"
+
+
+def get_report(profile_id):
+    return cache.get(_report_key(profile_id))
+
+
+def _slot_key(slot):
+    return f"profiles:slot:{slot}"
+
+
+def list_reports():
+    """
+    Return the summaries of the stored reports, newest first.
+
+    Summaries whose report has expired or been evicted are left out.
+    """
+    summaries = cache.get_many([_slot_key(slot) for slot in range(INDEX_SIZE)])
+    reports = cache.get_many(
+        [_report_key(summary["id"]) for summary in summaries.values()]
+    )
+    return sorted(
+        (
+            summary
+            for summary in summaries.values()
+            if _report_key(summary["id"]) in reports
+        ),
+        key=lambda summary: summary["created"],
+        reverse=True,
+    )
+
+
+def _store(report):
+    """
+    Store `report` and its summary.
+
+    Summaries go round-robin into INDEX_SIZE slots, each under its own key, so
+    that concurrent workers never overwrite each other's entries.
+    """
+    cache.set(_report_key(report["id"]), report, REPORT_TTL)
+    cache.add(SLOT_COUNTER_KEY, 0, None)
+    try:
+        slot = cache.incr(SLOT_COUNTER_KEY) % INDEX_SIZE
+    except ValueError:
+        # The counter was evicted in between; any slot will do.
+        slot = int(report["id"], 16) % INDEX_SIZE
+    summary = {
+        key: report[key]
+        for key in ("id", "created", "method", "path", "view", "status", "ms")
+    }
+    cache.set(_slot_key(slot), summary, REPORT_TTL)
+
+
+def _functions(profiler):
+    rows = []
+    stats = pstats.Stats(profiler).stats  # type: ignore[attr-defined]
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.items():
+        rows.append(
+            {
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "own_ms": round(own * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            }
+        )
+    return {
+        "by_cumulative_time": sorted(rows, key=lambda row: -row["cumulative_ms"])[
+            :TOP_FUNCTIONS
+        ],
+        "by_own_time": sorted(rows, key=lambda row: -row["own_ms"])[:TOP_FUNCTIONS],
+    }
+
+
+def _allocations(before, after):
+    ignore = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen *>"),
+    )
+    differences = after.filter_traces(ignore).compare_to(
+        before.filter_traces(ignore), "lineno"
+    )
+    return [
+        {
+            "site": f"{difference.traceback[0].filename}:"
+            f"{difference.traceback[0].lineno}",
+            "size_kb": round(difference.size_diff / 1024, 1),
+            "count": difference.count_diff,
+        }
+        for difference in differences[:TOP_ALLOCATIONS]
+        if difference.size_diff > 0
+    ]
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests that carry a valid `X-Profile` ticket; see `core.profiling`.
+
+    Must be the last middleware, so that every other `process_view` hook, such
+    as the CSRF check, has run before it calls the view itself.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django would otherwise run the sync hook in a worker thread.
+            self.process_view = self._aprocess_view  # type: ignore[method-assign]
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        ticket = request.headers.get("X-Profile")
+        if not ticket or iscoroutinefunction(view_func):
+            return None
+        if not ticket_is_valid(ticket):
+            return JsonResponse(
+                {"detail": "Invalid or expired profile ticket."}, status=403
+            )
+        if not _lock.acquire(blocking=False):
+            return JsonResponse(
+                {"detail": "Another request is being profiled; try again."},
+                status=409,
+            )
+        try:
+            return self.profile(request, view_func, view_args, view_kwargs)
+        finally:
+            _lock.release()
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if not request.headers.get("X-Profile"):
+            return None
+        # The view and its rendering run in the request's sync thread, where
+        # cProfile has to be enabled.
+        return await sync_to_async(
+            ProfilingMiddleware.process_view, thread_sensitive=True
+        )(self, request, view_func, view_args, view_kwargs)
+
+    def profile(self, request, view_func, view_args, view_kwargs):
+        statements = []
+
+        def record_sql(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                statements.append(
+                    {
+                        "sql": sql[:MAX_SQL_LENGTH],
+                        "ms": round((time.perf_counter() - started) * 1000, 3),
+                        "many": many,
+                    }
+                )
+
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        profiler = cProfile.Profile()
+        response = error = None
+        started = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(record_sql))
+                profiler.enable()
+                try:
+                    response = view_func(request, *view_args, **view_kwargs)
+                    # Render here, so that serialization is part of the profile.
+                    if callable(getattr(response, "render", None)):
+                        response = response.render()
+                finally:
+                    profiler.disable()
+        except Exception as exc:
+            error = repr(exc)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if not tracing:
+                tracemalloc.stop()
+            report = {
+                "id": uuid.uuid4().hex[:16],
+                "created": timezone.now().isoformat(),
+                "method": request.method,
+                "path": request.get_full_path(),
+                "view": view_label(view_func, request.method),
+                "status": response.status_code if response is not None else 500,
+                "error": error,
+                "ms": round(elapsed * 1000, 3),
+                "functions": _functions(profiler),
+                "sql": {
+                    "count": len(statements),
+                    "ms": round(sum(statement["ms"] for statement in statements), 3),
+                    "statements": statements[:MAX_STATEMENTS],
+                },
+                # tracemalloc sees every thread of the process, so allocations
+                # of concurrent requests can show up here too.
+                "memory": {
+                    "peak_kb": round(peak / 1024, 1),
+                    "allocations": _allocations(before, after),
+                },
+            }
+            _store(report)
+        response["X-Profile-Id"] = report["id"]
+        return response
@@ -0,0 +1,96 @@
+"""
+Read-replica routing.
+
+Safe requests (GET, HEAD, OPTIONS) to the API viewsets read from one of the
+replicas configured with `LS_POSTGRES_REPLICA_HOSTS`; every write, and every
+other read, goes to the primary (`default`). After a user writes, their reads
+stay on the primary for `LS_POSTGRES_REPLICA_PIN_SECONDS`, so that they see
+their own writes despite replication lag. Pins are kept in the cache, which
+must be shared for them to hold across workers.
+"""
+
+import contextvars
+import random
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from .config import REPLICA_ALIAS_PREFIX, settings
+
+# The database that reads of the current request go to, or None for the
+# primary. Chosen once per request, so that all its reads see the same state.
+_read_alias: contextvars.ContextVar = contextvars.ContextVar(
+    "replica_read_alias", default=None
+)
+
+
+def replica_aliases():
+    return [alias for alias in connections.settings if is_replica(alias)]
+
+
+def is_replica(alias):
+    return alias.startswith(REPLICA_ALIAS_PREFIX)
+
+
+def _pin_key(user_id):
+    return f"replicas:pin:{user_id}"
+
+
+def pin_to_primary(user):
+    """Send the reads of `user` to the primary for a while."""
+    cache.set(_pin_key(user.pk), True, settings.db.replica_pin_seconds)
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(_pin_key(user.pk)) is not None
+
+
+def read_from_replica(request):
+    """
+    Route the reads of a safe, unpinned `request` to a random replica.
+
+    Returns the token to pass to `read_from_primary`, or None when the request
+    reads from the primary.
+    """
+    if request.method not in SAFE_METHODS:
+        return None
+    aliases = replica_aliases()
+    if not aliases or is_pinned(request.user):
+        return None
+    return _read_alias.set(random.choice(aliases))
+
+
+def read_from_primary(token):
+    """Undo `read_from_replica`."""
+    if token is not None:
+        _read_alias.reset(token)
+
+
+def pin_after_write(request, response):
+    """Pin the user of a successful write to the primary, when there are replicas."""
+    if (
+        request.method not in SAFE_METHODS
+        and response.status_code < 400
+        and request.user.is_authenticated
+        and replica_aliases()
+    ):
+        pin_to_primary(request.user)
+
+
+class ReplicaRouter:
+    """Send reads to the replica chosen for the request, and writes to the primary."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication.
+        return False if is_replica(db) else None
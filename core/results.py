@@ -0,0 +1,41 @@
+from django.db.models import F, Sum
+
+from .models import DailyTally
+
+
+def _date_filter(prefix, date_from, date_to):
+    filters = {}
+    if date_from is not None:
+        filters[f"{prefix}__gte"] = date_from
+    if date_to is not None:
+        filters[f"{prefix}__lte"] = date_to
+    return filters
+
+
+def rank_rows(rows):
+    """
+    Assign a 1-based rank to result rows in the order they come in.
+
+    The ranking, tie-breaking included, is whatever the caller's ORDER BY makes
+    it; `rank_rows` only numbers the rows.
+    """
+    return [{**row, "rank": position} for position, row in enumerate(rows, start=1)]
+
+
+def read_tally(date_from=None, date_to=None):
+    """
+    Read the ranked results per restaurant from the sharded daily tally.
+
+    Returns a list of dicts with restaurant ID and name, total points, vote
+    count and rank; ties on points are broken by vote count, then restaurant
+    name and ID. Cost depends on the number of restaurants, not on the number
+    of votes.
+    """
+    rows = (
+        DailyTally.objects.filter(**_date_filter("date", date_from, date_to))
+        .values("restaurant", restaurant_name=F("restaurant__name"))
+        .annotate(points=Sum("points"), votes=Sum("votes"))
+        .filter(votes__gt=0)
+        .order_by("-points", "-votes", "restaurant_name", "restaurant_id")
+    )
+    return rank_rows(rows)
@@ -0,0 +1,170 @@
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import DailyRollup, DailyTally, Employee, StaleRollupDay, Vote
+from .results import _date_filter
+
+
+def _vote_totals(**filters):
+    """Return points and votes per day, restaurant and department, from the votes."""
+    rows = (
+        Vote.objects.filter(**filters)
+        .values("menu__date", "menu__restaurant_id", "employee__department")
+        .annotate(total_points=Sum("points"), total_votes=Count("id"))
+        .values_list(
+            "menu__date",
+            "menu__restaurant_id",
+            "employee__department",
+            "total_points",
+            "total_votes",
+        )
+    )
+    return {
+        (day, restaurant_id, department): (points, votes)
+        for day, restaurant_id, department, points, votes in rows
+    }
+
+
+def _totals(queryset, date_from, date_to):
+    rows = (
+        queryset.filter(**_date_filter("date", date_from, date_to))
+        .values("date", "restaurant_id")
+        .annotate(total_points=Sum("points"), total_votes=Sum("votes"))
+        .values_list("date", "restaurant_id", "total_points", "total_votes")
+    )
+    return {
+        (day, restaurant): (points, votes)
+        for day, restaurant, points, votes in rows
+        if votes
+    }
+
+
+def changed_days(date_from=None, date_to=None):
+    """
+    Return the days whose rollup is missing, differs from the daily tally or
+    has been marked stale.
+
+    The tally and the rollup are small, so this costs three small reads and no
+    vote scan. Points that only moved between departments leave the totals
+    unchanged, so their days are found through the stale marks.
+    """
+    tally = _totals(DailyTally.objects.all(), date_from, date_to)
+    rollup = _totals(DailyRollup.objects.all(), date_from, date_to)
+    days = {
+        day
+        for day, restaurant in tally.keys() | rollup.keys()
+        if tally.get((day, restaurant)) != rollup.get((day, restaurant))
+    }
+    days.update(
+        StaleRollupDay.objects.filter(
+            **_date_filter("date", date_from, date_to)
+        ).values_list("date", flat=True)
+    )
+    return sorted(days)
+
+
+def mark_employee_days(employee_id):
+    """Mark the days `employee_id` voted on as stale, e.g. after a department change."""
+    days = (
+        Vote.objects.filter(employee_id=employee_id)
+        .order_by()
+        .values_list("menu__date", flat=True)
+        .distinct()
+    )
+    StaleRollupDay.objects.bulk_create(
+        [StaleRollupDay(date=day) for day in days], ignore_conflicts=True
+    )
+
+
+def voting_days(date_from=None, date_to=None):
+    """Return every day that has votes or a rollup in the range."""
+    days = set(
+        DailyTally.objects.filter(**_date_filter("date", date_from, date_to))
+        .filter(votes__gt=0)
+        .values_list("date", flat=True)
+    )
+    days.update(
+        DailyRollup.objects.filter(
+            **_date_filter("date", date_from, date_to)
+        ).values_list("date", flat=True)
+    )
+    return sorted(days)
+
+
+def rollup_days(days):
+    """Recompute the rollup rows of `days` from the raw votes."""
+    with transaction.atomic():
+        # Clear the marks before reading the votes, so that a department change
+        # committed meanwhile either shows in the votes or leaves a new mark.
+        StaleRollupDay.objects.filter(date__in=days).delete()
+        rows = _vote_totals(menu__date__in=days)
+        DailyRollup.objects.filter(date__in=days).delete()
+        DailyRollup.objects.bulk_create(
+            [
+                DailyRollup(
+                    date=day,
+                    restaurant_id=restaurant_id,
+                    department=department,
+                    points=points,
+                    votes=votes,
+                )
+                for (day, restaurant_id, department), (points, votes) in rows.items()
+            ],
+            batch_size=1000,
+        )
+
+
+def daily_winners(date_from=None, date_to=None):
+    """
+    Return the winning restaurant of every day in the range.
+
+    Ties are broken like in the daily results: by vote count, then
+    restaurant name and ID.
+    """
+    rows = (
+        DailyRollup.objects.filter(**_date_filter("date", date_from, date_to))
+        .values("date", "restaurant", restaurant_name=F("restaurant__name"))
+        .annotate(points=Sum("points"), votes=Sum("votes"))
+        .order_by("date", "-points", "-votes", "restaurant_name", "restaurant_id")
+    )
+    winners = {}
+    for row in rows:
+        winners.setdefault(row["date"], row)
+    return list(winners.values())
+
+
+def restaurant_shares(date_from=None, date_to=None):
+    """Return points, votes and share of all points per restaurant."""
+    rows = list(
+        DailyRollup.objects.filter(**_date_filter("date", date_from, date_to))
+        .values("restaurant", restaurant_name=F("restaurant__name"))
+        .annotate(points=Sum("points"), votes=Sum("votes"))
+        .order_by("-points", "-votes", "restaurant_name", "restaurant_id")
+    )
+    # Points can all be 0, since votes can be edited down to 0 points.
+    total = sum(row["points"] for row in rows) or 1
+    return [{**row, "share": round(row["points"] / total, 4)} for row in rows]
+
+
+def department_participation(date_from=None, date_to=None):
+    """Return votes, points and share of all votes per employee department."""
+    rows = list(
+        DailyRollup.objects.filter(**_date_filter("date", date_from, date_to))
+        .values("department")
+        .annotate(points=Sum("points"), votes=Sum("votes"))
+        .order_by("-votes", "department")
+    )
+    headcount = dict(
+        Employee.objects.values("department")
+        .annotate(employees=Count("id"))
+        .values_list("department", "employees")
+    )
+    total = sum(row["votes"] for row in rows) or 1
+    return [
+        {
+            **row,
+            "share": round(row["votes"] / total, 4),
+            "employees": headcount.get(row["department"], 0),
+        }
+        for row in rows
+    ]
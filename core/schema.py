@@ -0,0 +1,34 @@
+import copy
+import threading
+from urllib.parse import urlsplit
+
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+
+class CachedSchemaGenerator(OpenAPISchemaGenerator):
+    """
+    OpenAPISchemaGenerator that builds the public schema once per process.
+
+    The endpoints only change with the code, so the schema is generated
+    without a request and kept; each request gets a shallow copy carrying its
+    own host and scheme. `serve` builds it in the master, before the workers
+    are forked.
+    """
+
+    _schemas: dict = {}
+    _lock = threading.Lock()
+
+    def get_schema(self, request=None, public=False):
+        # Per-user schemas and the stub rendered by the UI views are not kept.
+        if not public or self._gen.patterns is not None:
+            return super().get_schema(request, public)
+        key = (self.info.title, self.version, self.url)
+        with self._lock:
+            if key not in self._schemas:
+                self._schemas[key] = super().get_schema(None, public)
+        schema = copy.copy(self._schemas[key])
+        if self.url is None and request is not None:
+            url = urlsplit(request.build_absolute_uri())
+            schema.host = url.netloc
+            schema.schemes = [url.scheme]
+        return schema
@@ -1,26 +1,93 @@
-from rest_framework import serializers
+import time
+
+from django.contrib.auth import authenticate
+from rest_framework import exceptions, serializers
+from .authentication import REFRESH_SALT, read_token
+from .config import settings
 from .models import Restaurant, Menu, Employee, Vote
 
 
 class RestaurantSerializer(serializers.ModelSerializer):
     class Meta:
         model = Restaurant
-        fields = "__all__"
+        fields = ["id", "name", "address", "phone_number", "owner"]
 
 
 class MenuSerializer(serializers.ModelSerializer):
     class Meta:
         model = Menu
-        fields = "__all__"
+        fields = ["id", "date", "items", "restaurant"]
 
 
 class EmployeeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Employee
-        fields = "__all__"
+        fields = ["id", "department", "user"]
 
 
 class VoteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Vote
         fields = ["id", "employee", "menu", "points"]
+
+
+MAX_BALLOT_MENUS = 3
+
+
+class BallotEntrySerializer(serializers.Serializer):
+    menu_id = serializers.IntegerField()
+    points = serializers.IntegerField(min_value=1, max_value=3)
+
+
+class BallotSerializer(serializers.Serializer):
+    """Validate a whole Build-Version >= 2 ballot with a single menu lookup."""
+
+    votes = BallotEntrySerializer(
+        many=True, allow_empty=False, max_length=MAX_BALLOT_MENUS
+    )
+
+    def validate_votes(self, votes):
+        menu_ids = [vote["menu_id"] for vote in votes]
+        if len(set(menu_ids)) != len(menu_ids):
+            raise serializers.ValidationError(
+                "Each menu can only appear once per ballot."
+            )
+        # Only an existence check: the ballot is written with the menus' dates
+        # and restaurants as they are then.
+        menus = set(Menu.objects.filter(id__in=menu_ids).values_list("id", flat=True))
+        missing = [menu_id for menu_id in menu_ids if menu_id not in menus]
+        if missing:
+            raise serializers.ValidationError(f"Unknown menu IDs: {missing}.")
+        return votes
+
+
+class TokenObtainSerializer(serializers.Serializer):
+    username = serializers.CharField()
+    password = serializers.CharField(write_only=True, style={"input_type": "password"})
+
+    def validate(self, attrs):
+        user = authenticate(
+            request=self.context.get("request"),
+            username=attrs["username"],
+            password=attrs["password"],
+        )
+        if user is None:
+            raise serializers.ValidationError(
+                "Unable to log in with the provided credentials."
+            )
+        attrs["user"] = user
+        return attrs
+
+
+class TokenRefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+    def validate_refresh(self, value):
+        try:
+            # Access tokens are signed with another salt and fail here.
+            claims = read_token(value, settings.auth.refresh_ttl, salt=REFRESH_SALT)
+        except exceptions.AuthenticationFailed as exc:
+            raise serializers.ValidationError(exc.detail)
+        if time.time() - claims["iat"] > settings.auth.refresh_ttl:
+            raise serializers.ValidationError("Token can no longer be refreshed.")
+        return claims
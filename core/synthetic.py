@@ -0,0 +1,146 @@
+import random
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .dishes import build_dishes
+from .models import Dish, Employee, Menu, Restaurant, Vote
+
+SYNTHETIC_PASSWORD = "synthetic-password"
+BATCH_SIZE = 2000
+
+DEPARTMENTS = ["Engineering", "Marketing", "Sales", "Human Resources", "Finance"]
+DISHES = [
+    "Steak",
+    "Roasted Vegetables",
+    "Grilled Salmon",
+    "Caesar Salad",
+    "Garlic Bread",
+    "Spaghetti Bolognese",
+    "Penne Arrabbiata",
+    "Fettuccine Alfredo",
+    "Tiramisu",
+    "California Roll",
+    "Spicy Tuna Roll",
+    "Miso Soup",
+    "Sashimi Platter",
+    "Green Tea Ice Cream",
+]
+
+
+@dataclass
+class Organisation:
+    owner: User
+    admin: User
+    restaurants: list = field(default_factory=list)
+    menus: list = field(default_factory=list)
+    employees: list = field(default_factory=list)
+
+
+def create_organisation(
+    restaurants, employees, day=None, days=1, prefix="synthetic", seed=None
+):
+    """
+    Bulk-create a synthetic organisation with one menu per restaurant for each
+    of the `days` days up to and including `day`.
+
+    Every user shares one password hash, so creating users costs a single
+    PBKDF2 run. Usernames start with `prefix` so `delete_organisation` can
+    remove them again.
+    """
+    rng = random.Random(seed)
+    day = day or timezone.now().date()
+    password = make_password(SYNTHETIC_PASSWORD)
+
+    with transaction.atomic():
+        owner, admin = User.objects.bulk_create(
+            [
+                User(username=f"{prefix}_owner", password=password),
+                User(username=f"{prefix}_admin", password=password, is_staff=True),
+            ]
+        )
+        org = Organisation(owner=owner, admin=admin)
+        org.restaurants = Restaurant.objects.bulk_create(
+            [
+                Restaurant(
+                    name=f"{prefix} restaurant {i}",
+                    address=f"{i} Synthetic Street",
+                    phone_number=f"+1-555-{i:04d}",
+                    owner=owner,
+                )
+                for i in range(restaurants)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        org.menus = Menu.objects.bulk_create(
+            [
+                Menu(
+                    restaurant=restaurant,
+                    date=day - timedelta(days=offset),
+                    items=", ".join(rng.sample(DISHES, k=3)),
+                )
+                for offset in range(days - 1, -1, -1)
+                for restaurant in org.restaurants
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        Dish.objects.bulk_create(
+            [dish for menu in org.menus for dish in build_dishes(menu)],
+            batch_size=BATCH_SIZE,
+        )
+        users = User.objects.bulk_create(
+            [
+                User(username=f"{prefix}_employee_{i}", password=password)
+                for i in range(employees)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        org.employees = Employee.objects.bulk_create(
+            [Employee(user=user, department=rng.choice(DEPARTMENTS)) for user in users],
+            batch_size=BATCH_SIZE,
+        )
+    return org
+
+
+def create_votes(org, votes_per_day, seed=None):
+    """
+    Insert `votes_per_day` votes, one per employee, for every day with menus.
+
+    Rows are streamed with COPY, which is far faster than INSERTs at this
+    volume. The daily tally is not updated; rebuild it afterwards.
+    """
+    rng = random.Random(seed)
+    menus_by_day = defaultdict(list)
+    for menu in org.menus:
+        menus_by_day[menu.date].append(menu.id)
+    employee_ids = [employee.id for employee in org.employees]
+    voters = min(votes_per_day, len(employee_ids))
+    table = connection.ops.quote_name(Vote._meta.db_table)
+
+    total = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        with cursor.cursor.copy(
+            f"COPY {table} (employee_id, menu_id, points) FROM STDIN"
+        ) as copy:
+            for _, menu_ids in sorted(menus_by_day.items()):
+                for employee_id in rng.sample(employee_ids, voters):
+                    copy.write_row(
+                        (employee_id, rng.choice(menu_ids), rng.randint(1, 3))
+                    )
+                total += voters
+    return total
+
+
+def delete_organisation(prefix="synthetic"):
+    """Delete everything `create_organisation` created with this prefix."""
+    with transaction.atomic():
+        # Votes first, in one statement, so the cascades below have little
+        # left to collect.
+        Vote.objects.filter(employee__user__username__startswith=f"{prefix}_").delete()
+        Restaurant.objects.filter(name__startswith=f"{prefix} restaurant ").delete()
+        User.objects.filter(username__startswith=f"{prefix}_").delete()
@@ -0,0 +1,104 @@
+"""
+The sharded daily tally of votes per restaurant.
+
+The tally is kept in step explicitly by the code paths that write votes: the
+API views, `core.ballots` and the ingest queue. There are no model signals, so
+votes written any other way (the shell, raw SQL, a data migration, a cascade
+from a deletion outside the API) leave it stale until
+`python manage.py rebuild_tally` is run.
+"""
+
+import random
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from .live import publisher
+from .models import DailyTally, Vote
+
+# Number of counter rows per (date, restaurant). Readers always sum over all
+# shards, so this can be changed without migrating existing rows.
+TALLY_SHARDS = 8
+
+
+def add_delta(deltas, day, restaurant_id, points, votes):
+    """Accumulate a points/votes change for one (date, restaurant) key."""
+    key = (day, restaurant_id)
+    old_points, old_votes = deltas.get(key, (0, 0))
+    deltas[key] = (old_points + points, old_votes + votes)
+    return deltas
+
+
+def vote_deltas(votes, sign=1):
+    """Build tally deltas for Vote instances whose menu is already loaded."""
+    deltas = {}
+    for vote in votes:
+        add_delta(
+            deltas, vote.menu.date, vote.menu.restaurant_id, sign * vote.points, sign
+        )
+    return deltas
+
+
+def queryset_deltas(votes, sign=1):
+    """Build tally deltas for every vote in a queryset with one grouped query."""
+    deltas = {}
+    rows = (
+        votes.order_by()
+        .values("menu__date", "menu__restaurant_id")
+        .annotate(total_points=Sum("points"), total_votes=Count("id"))
+        .values_list("menu__date", "menu__restaurant_id", "total_points", "total_votes")
+    )
+    for day, restaurant_id, points, count in rows:
+        add_delta(deltas, day, restaurant_id, sign * points, sign * count)
+    return deltas
+
+
+def retract_vote(deltas, vote_id):
+    """Lock a stored vote and add the delta that removes it from the tally."""
+    day, restaurant_id, points = (
+        Vote.objects.select_for_update(of=("self",))
+        .filter(pk=vote_id)
+        .values_list("menu__date", "menu__restaurant_id", "points")
+        .get()
+    )
+    return add_delta(deltas, day, restaurant_id, -points, -1)
+
+
+def apply_deltas(deltas):
+    """
+    Add the deltas to a random shard with one multi-row upsert.
+
+    Must be called inside the transaction that changes the votes, so the tally
+    commits or rolls back together with them. Live result streams are woken
+    once the transaction commits.
+    """
+    rows = sorted(
+        (day, restaurant_id, points, votes)
+        for (day, restaurant_id), (points, votes) in deltas.items()
+        if points or votes
+    )
+    if not rows:
+        return
+    shard = random.randrange(TALLY_SHARDS)
+    table = connection.ops.quote_name(DailyTally._meta.db_table)
+    values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+    params = [
+        value
+        for day, restaurant_id, points, votes in rows
+        for value in (day, restaurant_id, shard, points, votes)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (date, restaurant_id, shard, points, votes) "
+            f"VALUES {values} "
+            "ON CONFLICT (date, restaurant_id, shard) DO UPDATE SET "
+            f"points = {table}.points + EXCLUDED.points, "
+            f"votes = {table}.votes + EXCLUDED.votes",
+            params,
+        )
+    transaction.on_commit(publisher.notify)
+
+
+def record_votes(votes, sign=1):
+    """Apply the tally change for created (sign=1) or deleted (sign=-1) votes."""
+    apply_deltas(vote_deltas(votes, sign))
@@ -0,0 +1,74 @@
+import math
+
+import pytest
+from django.utils import timezone
+
+from core.authentication import issue_token
+from core.models import Vote
+from core.rollups import changed_days, rollup_days
+from core.synthetic import create_organisation
+from core.tally import record_votes
+
+# Votes cast today. Costs that grow with data size show up as a budget
+# failure at the larger scales only.
+SCALES = [10, 1_000, 10_000]
+
+
+@pytest.fixture(params=SCALES, ids=lambda scale: f"{scale}-votes")
+def voting_day(request, db):
+    """Today's menus with `request.param` votes, three per employee."""
+    scale = request.param
+    # Two extra employees who have not voted yet.
+    org = create_organisation(
+        restaurants=10, employees=math.ceil(scale / 3) + 2, prefix="budget", seed=1
+    )
+    votes = [
+        Vote(employee=org.employees[i // 3], menu=org.menus[i % 10], points=i % 3 + 1)
+        for i in range(scale)
+    ]
+    record_votes(Vote.objects.bulk_create(votes, batch_size=2000))
+    rollup_days(changed_days())
+    return org
+
+
+def test_endpoint_budgets(budget_client, voting_day):
+    org = voting_day
+    today = timezone.now().date().isoformat()
+    admin = f"Bearer {issue_token(org.admin, None)}"
+    owner = f"Bearer {issue_token(org.owner, None)}"
+    voter, new_voter, ballot_voter = (
+        f"Bearer {issue_token(employee.user, employee.id)}"
+        for employee in (org.employees[0], org.employees[-2], org.employees[-1])
+    )
+    requests = [
+        ("get", "/api/menus/today/", voter, None, None),
+        ("get", f"/api/menus/?date={today}", voter, None, None),
+        ("get", f"/api/menus/?restaurant={org.restaurants[0].id}", owner, None, None),
+        ("get", "/api/restaurants/", admin, None, None),
+        ("get", "/api/employees/", admin, None, None),
+        ("get", "/api/votes/", admin, None, None),
+        ("get", f"/api/votes/?date={today}", admin, None, None),
+        ("get", "/api/votes/results/today/", admin, None, None),
+        ("get", "/api/analytics/winners/", admin, None, None),
+        ("get", "/api/analytics/restaurants/", admin, None, None),
+        ("get", "/api/analytics/departments/", admin, None, None),
+        ("post", "/api/votes/", new_voter, "1", {"menu_id": org.menus[0].id}),
+        (
+            "post",
+            "/api/votes/",
+            ballot_voter,
+            "2",
+            {
+                "votes": [
+                    {"menu_id": menu.id, "points": points}
+                    for points, menu in enumerate(org.menus[:3], start=1)
+                ]
+            },
+        ),
+    ]
+    for method, path, token, build_version, data in requests:
+        headers = {"HTTP_AUTHORIZATION": token}
+        if build_version:
+            headers["HTTP_BUILD_VERSION"] = build_version
+        response = getattr(budget_client, method)(path, data, format="json", **headers)
+        assert response.status_code < 300, (path, response.data)
@@ -1,10 +1,27 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import RestaurantViewSet, MenuViewSet, EmployeeViewSet, VoteViewSet
+from .views import (
+    RestaurantViewSet,
+    MenuViewSet,
+    EmployeeViewSet,
+    VoteViewSet,
+    AuthTokenViewSet,
+    DatabaseViewSet,
+    AnalyticsViewSet,
+    ProfileViewSet,
+    results_stream,
+)
 
 router = DefaultRouter()
 router.register(r"restaurants", RestaurantViewSet)
 router.register(r"menus", MenuViewSet)
 router.register(r"employees", EmployeeViewSet)
 router.register(r"votes", VoteViewSet)
+router.register(r"auth/token", AuthTokenViewSet, basename="auth-token")
+router.register(r"db", DatabaseViewSet, basename="db")
+router.register(r"analytics", AnalyticsViewSet, basename="analytics")
+router.register(r"profiles", ProfileViewSet, basename="profiles")
 
-urlpatterns = router.urls
+urlpatterns = [
+    path("votes/results/stream/", results_stream, name="results-stream"),
+] + router.urls
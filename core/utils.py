@@ -0,0 +1,40 @@
+from datetime import date, timedelta
+
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+
+def parse_date_param(params, name):
+    """Parse an optional ISO date query parameter."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: "Date must be in YYYY-MM-DD format."})
+
+
+def parse_date_range(params, default_days=1):
+    """
+    Resolve `date`, `date_from` and `date_to` query parameters into a range.
+
+    Defaults to the last `default_days` days, up to and including today, when
+    none of them is given.
+    """
+    day = parse_date_param(params, "date")
+    date_from = parse_date_param(params, "date_from")
+    date_to = parse_date_param(params, "date_to")
+
+    if day is not None:
+        if date_from is not None or date_to is not None:
+            raise ValidationError(
+                "Use either 'date' or 'date_from'/'date_to', not both."
+            )
+        return day, day
+    if date_from is None and date_to is None:
+        today = timezone.now().date()
+        return today - timedelta(days=default_days - 1), today
+    if date_from is not None and date_to is not None and date_from > date_to:
+        raise ValidationError("'date_from' must not be after 'date_to'.")
+    return date_from, date_to
@@ -1,7 +1,22 @@
+import hmac
+
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    DatabaseError,
+    IntegrityError,
+    connection,
+    transaction,
+)
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from .models import Restaurant, Menu, Employee, Vote
 from .serializers import (
@@ -9,6 +24,22 @@ from .serializers import (
     MenuSerializer,
     EmployeeSerializer,
     VoteSerializer,
+    BallotSerializer,
+    TokenObtainSerializer,
+    TokenRefreshSerializer,
+)
+from .authentication import (
+    SignedTokenAuthentication,
+    issue_refresh_token,
+    issue_token,
+)
+from .config import settings
+from .ballots import (
+    DailyLimitExceeded,
+    check_daily_limit,
+    lock_employees,
+    read_menus,
+    submit_ballot,
 )
 from .permissions import (
     IsAdmin,
@@ -17,12 +48,51 @@ from .permissions import (
     IsVoteOwner,
     IsRestaurantOwner,
 )
-from rest_framework.exceptions import ValidationError, PermissionDenied
+from rest_framework.exceptions import (
+    AuthenticationFailed,
+    NotFound,
+    PermissionDenied,
+    ValidationError,
+)
+from rest_framework.reverse import reverse
+from .cache import get_menu_board, invalidate_menu_board, menu_board_hit_rate
+from .db import pool_stats
+from .dishes import search_menus, sync_dishes
+from .export import (
+    EXPORT_FIELDS,
+    aexport_rows,
+    encode_csv,
+    encode_ndjson,
+    export_rows,
+)
+from .filters import MenuFilterBackend, VoteFilterBackend
+from .idempotency import idempotent
+from .ingest import get_vote_queue
+from .mixins import ReplicaReadMixin, ValuesListMixin
+from .live import stream_results
+from .metrics import render_metrics
+from .principal import get_principal
+from .profiling import TICKET_TTL, get_report, issue_ticket, list_reports
+from .renderers import CSVRenderer, NDJSONRenderer
+from .results import read_tally
+from .rollups import (
+    daily_winners,
+    department_participation,
+    mark_employee_days,
+    restaurant_shares,
+)
+from .tally import (
+    add_delta,
+    apply_deltas,
+    queryset_deltas,
+    retract_vote,
+)
+from .utils import parse_date_range
 
 V2: int = 2
 
 
-class RestaurantViewSet(viewsets.ModelViewSet):
+class RestaurantViewSet(ReplicaReadMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Restaurant.objects.all()
     serializer_class = RestaurantSerializer
     permission_classes = [IsAuthenticated]
@@ -35,10 +105,18 @@ class RestaurantViewSet(viewsets.ModelViewSet):
             self.permission_classes = [IsAuthenticated | ReadOnly]
         return super().get_permissions()
 
+    def perform_destroy(self, instance):
+        # The restaurant's menus go with it, and so do their boards.
+        days = list(instance.menus.values_list("date", flat=True).distinct())
+        instance.delete()
+        transaction.on_commit(lambda: invalidate_menu_board(*days))
+
 
-class MenuViewSet(viewsets.ModelViewSet):
+class MenuViewSet(ReplicaReadMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Menu.objects.all()
     serializer_class = MenuSerializer
+    cursor_ordering = ("date", "id")
+    filter_backends = [MenuFilterBackend]
 
     def get_permissions(self):
         if self.action in ["create", "update", "partial_update", "destroy"]:
@@ -50,29 +128,118 @@ class MenuViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         # Ensure the restaurant in the request belongs to the authenticated user
         restaurant = serializer.validated_data["restaurant"]
-        if restaurant.owner != self.request.user:
+        if restaurant.id not in get_principal(self.request).restaurant_ids:
             raise PermissionDenied(
                 "You do not have permission to add a menu for this restaurant."
             )
-        serializer.save()
+        with transaction.atomic():
+            menu = serializer.save()
+            sync_dishes(menu)
+        transaction.on_commit(lambda: invalidate_menu_board(menu.date))
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            self._lock(serializer.instance)
+            old_key = (serializer.instance.date, serializer.instance.restaurant_id)
+            old_items = serializer.instance.items
+            menu = serializer.save()
+            if menu.items != old_items:
+                sync_dishes(menu)
+            new_key = (menu.date, menu.restaurant_id)
+            if new_key != old_key:
+                # Move the menu's votes to the new date/restaurant in the tally.
+                totals = Vote.objects.filter(menu=menu).aggregate(
+                    points=Coalesce(Sum("points"), 0), votes=Count("id")
+                )
+                deltas = add_delta({}, *old_key, -totals["points"], -totals["votes"])
+                add_delta(deltas, *new_key, totals["points"], totals["votes"])
+                apply_deltas(deltas)
+            transaction.on_commit(lambda: invalidate_menu_board(old_key[0], new_key[0]))
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            self._lock(instance)
+            deltas = queryset_deltas(Vote.objects.filter(menu=instance), sign=-1)
+            day = instance.date
+            instance.delete()
+            apply_deltas(deltas)
+            transaction.on_commit(lambda: invalidate_menu_board(day))
+
+    def _lock(self, menu):
+        """Lock the menu row so no vote for it can be written concurrently."""
+        Menu.objects.select_for_update().filter(pk=menu.pk).values_list("pk").get()
 
     @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
     def today(self, request):
         today = timezone.now().date()
-        menus = Menu.objects.filter(date=today)
-        serializer = self.get_serializer(menus, many=True)
-        return Response(serializer.data)
+
+        def build():
+            # From the primary, as a board read from a lagging replica would
+            # stay cached until the next menu change.
+            return list(
+                Menu.objects.using(DEFAULT_DB_ALIAS)
+                .filter(date=today)
+                .values(*MenuSerializer.Meta.fields)
+            )
+
+        return Response(get_menu_board(today, build))
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
+    def search(self, request):
+        """
+        Find menus with a dish or item matching `q`, e.g. `vegan -nuts`.
+
+        `allergen_free` (comma-separated) keeps only dishes without those
+        allergens. Accepts the same date and restaurant filters as the list.
+        """
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            raise ValidationError({"q": "This query parameter is required."})
+        allergen_free = request.query_params.get("allergen_free", "").split(",")
+        queryset = search_menus(
+            self.filter_queryset(self.get_queryset()), text, allergen_free
+        )
+        page = self.paginate_queryset(queryset.values(*MenuSerializer.Meta.fields))
+        return self.get_paginated_response(page)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="today/cache-stats",
+        permission_classes=[IsAuthenticated, IsAdmin],
+    )
+    def cache_stats(self, request):
+        """Hit/miss counters of this worker's menu board cache."""
+        return Response(menu_board_hit_rate())
 
 
-class EmployeeViewSet(viewsets.ModelViewSet):
+class EmployeeViewSet(ReplicaReadMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Employee.objects.all()
     serializer_class = EmployeeSerializer
     permission_classes = [IsAdmin]  # Only admin can manage employee data
 
+    def perform_update(self, serializer):
+        department = serializer.instance.department
+        with transaction.atomic():
+            employee = serializer.save()
+            if employee.department != department:
+                mark_employee_days(employee.pk)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # Ballots lock the employee row too, so no vote can slip in here.
+            Employee.objects.select_for_update().filter(pk=instance.pk).values_list(
+                "pk"
+            ).get()
+            deltas = queryset_deltas(Vote.objects.filter(employee=instance), sign=-1)
+            instance.delete()
+            apply_deltas(deltas)
 
-class VoteViewSet(viewsets.ModelViewSet):
+
+class VoteViewSet(ReplicaReadMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Vote.objects.all()
     serializer_class = VoteSerializer
+    filter_backends = [VoteFilterBackend]
 
     def get_serializer_class(self):
         """Return different serializers based on build version in the request."""
@@ -82,14 +249,72 @@ class VoteViewSet(viewsets.ModelViewSet):
         """Set custom permissions for different actions."""
         if self.action in ["update", "partial_update", "destroy"]:
             self.permission_classes = [IsAuthenticated, IsVoteOwner]
-        elif self.action == "create":
+        elif self.action in ["create", "ballot"]:
             self.permission_classes = [IsAuthenticated, IsEmployee]
-        elif self.action == "get_today_results":
+        elif self.action in ["get_today_results", "export"]:
             self.permission_classes = [IsAuthenticated, IsAdmin]
         else:
             self.permission_classes = [IsAuthenticated | ReadOnly]
         return super().get_permissions()
 
+    def _lock_vote(self, employee, menu, exclude_vote_id=None, old_menu=None):
+        """
+        Lock the employee and the menus, check the daily limit and return the
+        menu's current date and restaurant.
+
+        The menu loaded by the serializer may have moved since; see `read_menus`.
+        """
+        lock_employees([employee.pk])
+        menus = read_menus({menu.pk} | ({old_menu.pk} if old_menu else set()))
+        if menu.pk not in menus:
+            raise ValidationError({"menu": ["This menu no longer exists."]})
+        day, restaurant_id = menus[menu.pk]
+        try:
+            check_daily_limit([(employee.pk, day, menu.pk)], exclude_vote_id)
+        except DailyLimitExceeded as exc:
+            raise ValidationError(str(exc))
+        return day, restaurant_id
+
+    def perform_create(self, serializer):
+        try:
+            with transaction.atomic():
+                day, restaurant_id = self._lock_vote(
+                    serializer.validated_data["employee"],
+                    serializer.validated_data["menu"],
+                )
+                vote = serializer.save()
+                apply_deltas(add_delta({}, day, restaurant_id, vote.points, 1))
+        except IntegrityError:
+            # A concurrent retry won the race past the unique validator.
+            raise ValidationError(
+                {
+                    "non_field_errors": [
+                        "The fields employee, menu must make a unique set."
+                    ]
+                }
+            )
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            day, restaurant_id = self._lock_vote(
+                serializer.validated_data.get("employee", serializer.instance.employee),
+                serializer.validated_data.get("menu", serializer.instance.menu),
+                exclude_vote_id=serializer.instance.pk,
+                old_menu=serializer.instance.menu,
+            )
+            deltas = retract_vote({}, serializer.instance.pk)
+            vote = serializer.save()
+            add_delta(deltas, day, restaurant_id, vote.points, 1)
+            apply_deltas(deltas)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            read_menus([instance.menu_id])
+            deltas = retract_vote({}, instance.pk)
+            instance.delete()
+            apply_deltas(deltas)
+
+    @idempotent
     def create(self, request, *args, **kwargs):
         build_version = request.headers.get("Build-Version")
         if not build_version:
@@ -106,29 +331,83 @@ class VoteViewSet(viewsets.ModelViewSet):
             # Old version: Accept a single menu ID
             menu_id = data.get("menu_id")
             vote_data = {
-                "employee": request.user.employee.id,
+                "employee": get_principal(request).employee_id,
                 "menu": menu_id,
                 "points": 1,
             }
         else:
             # New version: Accept up to 3 menu IDs with respective points
-            votes = data.get("votes")
-            for vote in votes:
-                vote_data = {
-                    "employee": request.user.employee.id,
-                    "menu": vote["menu_id"],
-                    "points": vote["points"],
-                }
-                serializer = self.get_serializer(data=vote_data)
-                serializer.is_valid(raise_exception=True)
-                self.perform_create(serializer)
-            return Response(status=status.HTTP_201_CREATED)
+            ballot = BallotSerializer(data=data)
+            ballot.is_valid(raise_exception=True)
+            employee_id = get_principal(request).employee_id
+            if settings.ingest.mode == "queue":
+                ballot_id = get_vote_queue().put(
+                    employee_id, ballot.validated_data["votes"]
+                )
+                url = reverse(
+                    "vote-ballot", kwargs={"ballot_id": ballot_id}, request=request
+                )
+                return Response(
+                    {"ballot": ballot_id, "status": "queued", "url": url},
+                    status=status.HTTP_202_ACCEPTED,
+                    headers={"Location": url},
+                )
+            try:
+                votes = submit_ballot(employee_id, ballot.validated_data["votes"])
+            except (DailyLimitExceeded, Menu.DoesNotExist) as exc:
+                raise ValidationError(str(exc))
+            serializer = self.get_serializer(votes, many=True)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         serializer = self.get_serializer(data=vote_data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path=r"ballots/(?P<ballot_id>[0-9a-f]{32})",
+    )
+    def ballot(self, request, ballot_id):
+        """Return whether a ballot accepted with 202 has been committed."""
+        ballot = get_vote_queue().get(ballot_id)
+        if ballot is None or ballot.pop("employee_id") != (
+            get_principal(request).employee_id
+        ):
+            raise NotFound("Unknown ballot.")
+        return Response(ballot)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        renderer_classes=[NDJSONRenderer, CSVRenderer],
+    )
+    def export(self, request):
+        """
+        Stream all votes matching the list filters as NDJSON or CSV.
+
+        Pick the format with `?format=ndjson|csv` or the Accept header.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        # Bind the database now: the rows are read after the view has returned.
+        queryset = queryset.using(queryset.db)
+        if request.accepted_renderer.format == "csv":
+            encode, header = encode_csv, encode_csv([EXPORT_FIELDS])
+        else:
+            encode, header = encode_ndjson, b""
+        if isinstance(request._request, ASGIRequest):
+            rows = aexport_rows(queryset, encode, header)
+        else:
+            rows = export_rows(queryset, encode, header)
+        response = StreamingHttpResponse(
+            rows, content_type=request.accepted_renderer.media_type
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="votes.{request.accepted_renderer.format}"'
+        )
+        return response
+
     @action(
         detail=False,
         methods=["get"],
@@ -136,15 +415,176 @@ class VoteViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated, IsAdmin],
     )
     def get_today_results(self, request):
-        today = timezone.now().date()
-        votes = Vote.objects.filter(menu__date=today)
+        """
+        Return per-restaurant points, vote count and rank.
+
+        Defaults to today; accepts `date` or a `date_from`/`date_to` range.
+        """
+        date_from, date_to = parse_date_range(request.query_params)
+        return Response(read_tally(date_from, date_to))
+
+
+class DatabaseViewSet(viewsets.ViewSet):
+    """Runtime database connection statistics for admins."""
+
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @action(detail=False, methods=["get"])
+    def pool(self, request):
+        return Response(pool_stats())
+
+
+class ProfileViewSet(viewsets.ViewSet):
+    """
+    Per-request profiles for admins.
+
+    `ticket` issues a signed ticket; send it as the `X-Profile` header with a
+    request, under any credentials, to have that request profiled. The
+    response names its report in `X-Profile-Id`.
+    """
+
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def list(self, request):
+        return Response(list_reports())
+
+    def retrieve(self, request, pk=None):
+        report = get_report(pk)
+        if report is None:
+            raise NotFound("No such profile, or it has expired.")
+        return Response(report)
+
+    @action(detail=False, methods=["post"])
+    def ticket(self, request):
+        return Response(
+            {"ticket": issue_ticket(request.user), "expires_in": TICKET_TTL}
+        )
+
+
+class AnalyticsViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    """
+    Historical voting reports for admins, read from the daily rollups.
 
-        # Aggregate voting results
-        results = {}
-        for vote in votes:
-            restaurant_name = vote.menu.restaurant.name
-            if restaurant_name not in results:
-                results[restaurant_name] = 0
-            results[restaurant_name] += vote.points
+    Every report accepts `date` or a `date_from`/`date_to` range and defaults
+    to the last 30 days. Run `update_rollups` to bring the rollups up to date.
+    """
 
-        return Response(results)
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @action(detail=False, methods=["get"])
+    def winners(self, request):
+        """Return the winning restaurant of every day."""
+        date_from, date_to = parse_date_range(request.query_params, default_days=30)
+        return Response(daily_winners(date_from, date_to))
+
+    @action(detail=False, methods=["get"])
+    def restaurants(self, request):
+        """Return each restaurant's points, votes and share of all points."""
+        date_from, date_to = parse_date_range(request.query_params, default_days=30)
+        return Response(restaurant_shares(date_from, date_to))
+
+    @action(detail=False, methods=["get"])
+    def departments(self, request):
+        """Return votes, points and share of all votes per department."""
+        date_from, date_to = parse_date_range(request.query_params, default_days=30)
+        return Response(department_participation(date_from, date_to))
+
+
+class AuthTokenViewSet(viewsets.ViewSet):
+    """Issue and refresh stateless API tokens."""
+
+    authentication_classes = []  # type: ignore
+    permission_classes = [AllowAny]
+
+    def create(self, request):
+        serializer = TokenObtainSerializer(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data["user"]
+        return self._token_response(user)
+
+    @action(detail=False, methods=["post"])
+    def refresh(self, request):
+        serializer = TokenRefreshSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        claims = serializer.validated_data["refresh"]
+        # Re-read the user so deactivated accounts and role changes take effect.
+        user = User.objects.filter(pk=claims["uid"], is_active=True).first()
+        if user is None:
+            raise ValidationError("User is inactive or no longer exists.")
+        return self._token_response(user, issued_at=claims["iat"])
+
+    def _token_response(self, user, issued_at=None):
+        employee_id = (
+            Employee.objects.filter(user=user).values_list("id", flat=True).first()
+        )
+        return Response(
+            {
+                "token": issue_token(user, employee_id),
+                "refresh": issue_refresh_token(user, issued_at),
+                "expires_in": settings.auth.token_ttl,
+            }
+        )
+
+
+def _deny_stream(request):
+    """
+    Authenticate like the API views, bearer token first and then the session,
+    and return the response refusing a non-admin, if any.
+    """
+    try:
+        authenticated = SignedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed as exc:
+        response = JsonResponse(
+            {"detail": exc.detail}, status=status.HTTP_401_UNAUTHORIZED
+        )
+        response["WWW-Authenticate"] = "Bearer"
+        return response
+    if authenticated is not None:
+        request.user = authenticated[0]
+    if not IsAdmin().has_permission(request, None):
+        return JsonResponse(
+            {"detail": "You do not have permission to perform this action."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+    return None
+
+
+async def results_stream(request):
+    """Stream today's results and their changes as Server-Sent Events."""
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(
+            "The live results stream requires the ASGI server.", status=501
+        )
+    denied = await sync_to_async(_deny_stream)(request)
+    if denied is not None:
+        return denied
+    response = StreamingHttpResponse(stream_results(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def readiness(request):
+    """Answer 200 once the database can be queried, 503 until then."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except DatabaseError:
+        return JsonResponse({"status": "unavailable"}, status=503)
+    return JsonResponse({"status": "ready"})
+
+
+def metrics(request):
+    """Serve the request and worker metrics in the Prometheus text format."""
+    if not settings.metrics.enabled:
+        raise Http404
+    token = settings.metrics.token
+    if token is not None and not hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token.get_secret_value()}"
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -2,7 +2,7 @@
 
 # Wait for PostgreSQL to be available
 echo "Waiting for PostgreSQL..."
-python wait_for_postgres.py
+python wait_for_postgres.py || exit 1
 
 # Apply database migrations
 echo "Applying database migrations..."
@@ -20,11 +20,9 @@ fi
 
 # Start the server
 echo "Starting server..."
-python manage.py runserver 0.0.0.0:8000
-
-# Delete initial data on shutdown (trap SIGTERM and SIGINT)
-trap 'echo "Deleting initial data..."; python manage.py delete_initial_data' SIGTERM SIGINT
-
-# Keep the script running to catch signals
-tail -f /dev/null
-
+if [ "$SERVE_MODE" = "dev" ]; then
+    python manage.py runserver 0.0.0.0:8000
+else
+    # Replace the shell so the server receives SIGTERM and shuts down gracefully
+    exec python manage.py serve --settings=lunch_service.settings_production
+fi
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -52,6 +53,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # Last, so that every other process_view hook runs before it.
+    "core.profiling.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "lunch_service.urls"
@@ -78,14 +81,23 @@ WSGI_APPLICATION = "lunch_service.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Connection reuse, pooling and read replicas are configured through
+# core.config.Postgres.
 DATABASES = {
+    "default": settings.db.django_database(),
+    **settings.db.replica_databases(),
+}
+
+DATABASE_ROUTERS = ["core.replicas.ReplicaRouter"]
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
-        "NAME": settings.db.database,
-        "USER": settings.db.username,
-        "PASSWORD": settings.db.password.get_secret_value(),
-        "HOST": settings.db.host,
-        "PORT": settings.db.port,
+        "BACKEND": settings.cache.backend,
+        "LOCATION": settings.cache.location,
+        "TIMEOUT": settings.cache.timeout,
     }
 }
 
@@ -108,6 +120,29 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "core.authentication.SignedTokenAuthentication",
+        "rest_framework.authentication.SessionAuthentication",
+        "rest_framework.authentication.BasicAuthentication",
+    ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "core.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+    "DEFAULT_PAGINATION_CLASS": "core.pagination.KeysetPagination",
+    "PAGE_SIZE": 50,
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -0,0 +1,46 @@
+"""
+Production settings for lunch_service project.
+
+Used by `python manage.py serve --settings=lunch_service.settings_production`.
+Debug mode is off, so Django no longer keeps every SQL query in memory.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F403
+from .settings import BASE_DIR, REST_FRAMEWORK, settings
+
+DEBUG = False
+
+ALLOWED_HOSTS = [
+    host.strip() for host in settings.server.allowed_hosts.split(",") if host.strip()
+]
+if not ALLOWED_HOSTS:
+    raise ImproperlyConfigured("Set LS_SERVER_ALLOWED_HOSTS for production.")
+
+# API tokens and profile tickets are signed with SECRET_KEY, so the development
+# key committed in settings.py would let anyone forge them.
+if settings.server.secret_key is None:
+    raise ImproperlyConfigured("Set LS_SERVER_SECRET_KEY for production.")
+SECRET_KEY = settings.server.secret_key.get_secret_value()
+
+# /metrics names every view and reports worker resources; keep it private.
+if settings.metrics.enabled and settings.metrics.token is None:
+    raise ImproperlyConfigured(
+        "Set LS_METRICS_TOKEN, or LS_METRICS_ENABLED=false, for production."
+    )
+
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_RENDERER_CLASSES": ["core.renderers.ORJSONRenderer"],
+}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "root": {"handlers": ["console"], "level": "INFO"},
+    "loggers": {"django.db.backends": {"level": "WARNING", "propagate": True}},
+}
@@ -21,22 +21,32 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from core.schema import CachedSchemaGenerator
+from core.views import metrics, readiness
+
+api_info = openapi.Info(
+    title="Lunch Service API",
+    default_version="v1",
+    description="API documentation for the Lunch Service backend",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="support@lunchservice.com"),
+    license=openapi.License(name="BSD License"),
+)
+
+# The schema is generated once per process by CachedSchemaGenerator, so the
+# views need no response cache of their own.
 schema_view = get_schema_view(
-    openapi.Info(
-        title="Lunch Service API",
-        default_version="v1",
-        description="API documentation for the Lunch Service backend",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="support@lunchservice.com"),
-        license=openapi.License(name="BSD License"),
-    ),
+    api_info,
     public=True,
+    generator_class=CachedSchemaGenerator,
     permission_classes=(permissions.AllowAny,),
 )
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("core.urls")),
+    path("readyz", readiness, name="readiness"),
+    path("metrics", metrics, name="metrics"),
     path(
         "swagger/",
         schema_view.with_ui("swagger", cache_timeout=0),
@@ -1,29 +1,71 @@
-import psycopg2
+import argparse
+import random
+import sys
 import time
+
+import psycopg
 from loguru import logger
+from psycopg import pq
+from psycopg.conninfo import make_conninfo
 
 from core.config import settings
 
+INITIAL_DELAY = 0.1
+MAX_DELAY = 5.0
+CONNECT_TIMEOUT = 5
+
+
+def wait_for_postgres(timeout=120.0):
+    """
+    Wait until PostgreSQL accepts logins to the service database.
 
-def wait_for_postgres():
+    The server is pinged, which needs no login, with exponential backoff and
+    jitter; a login is only tried once it answers. Returns False if it is not
+    ready within `timeout` seconds.
+    """
+    db = settings.db
+    conninfo = make_conninfo(
+        dbname=db.database,
+        user=db.username,
+        password=db.password.get_secret_value(),
+        host=db.host,
+        port=db.port,
+        connect_timeout=CONNECT_TIMEOUT,
+    )
+    logger.info(f"Waiting for postgres://{db.host}:{db.port}/{db.database}")
+    started = time.monotonic()
+    delay = INITIAL_DELAY
     while True:
-        try:
-            url = f"postgres://{settings.db.host}:{settings.db.port}/{settings.db.database}"
-            logger.info(f"Connecting with url: {url}")
-            conn = psycopg2.connect(
-                dbname=settings.db.database,
-                user=settings.db.username,
-                password=settings.db.password.get_secret_value(),
-                host=settings.db.host,
-                port=settings.db.port,
-            )
-            conn.close()
-            logger.info("PostgreSQL is ready.")
-            break
-        except psycopg2.OperationalError:
-            logger.info("Waiting for PostgreSQL to be ready...")
-            time.sleep(1)
+        ping = pq.PGconn.ping(conninfo.encode())
+        if ping == pq.Ping.NO_ATTEMPT:
+            logger.error("Invalid PostgreSQL connection parameters.")
+            return False
+        if ping == pq.Ping.OK:
+            try:
+                psycopg.connect(conninfo).close()
+            except psycopg.OperationalError as exc:
+                logger.info(f"PostgreSQL is up but not ready: {exc}")
+            else:
+                logger.info(
+                    f"PostgreSQL is ready after {time.monotonic() - started:.1f} s."
+                )
+                return True
+        remaining = timeout - (time.monotonic() - started)
+        if remaining <= 0:
+            logger.error(f"PostgreSQL was not ready within {timeout:g} s.")
+            return False
+        time.sleep(min(random.uniform(delay / 2, delay), remaining))
+        delay = min(delay * 2, MAX_DELAY)
 
 
 if __name__ == "__main__":
-    wait_for_postgres()
+    parser = argparse.ArgumentParser(
+        description="Wait until PostgreSQL accepts logins."
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=120.0,
+        help="Seconds to wait before giving up (default: 120).",
+    )
+    sys.exit(0 if wait_for_postgres(parser.parse_args().timeout) else 1)